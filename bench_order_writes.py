@@ -0,0 +1,120 @@
+# bench_order_writes.py
+"""
+Stress benchmark for the order write path in db_manager.
+
+N concurrent writers race to update, comment on and cancel the same set of
+orders in a throw-away database. At the end we check that:
+  - every order's edit counter equals writers x rounds (no lost read-modify-write updates)
+  - every stored comment is one a writer actually wrote
+  - every order was canceled exactly once (no double cancel / lost race)
+
+Usage:
+    python bench_order_writes.py --writers 32 --orders 200 --batch-size 64
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import db_manager
+
+
+def make_db(path, n_orders):
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE food_orders (id INTEGER PRIMARY KEY, person_name TEXT, "
+        "person_phone_number TEXT, status TEXT, comment TEXT, edits INTEGER NOT NULL DEFAULT 0)"
+    )
+    connection.executemany(
+        "INSERT INTO food_orders (id, person_name, person_phone_number, status) VALUES (?, ?, ?, 'preparation')",
+        [(i, f"user{i}", "0912") for i in range(1, n_orders + 1)],
+    )
+    connection.commit()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5, help="update rounds per writer")
+    parser.add_argument("--batch-size", type=int, default=db_manager.WRITE_BATCH_SIZE,
+                        help="group commit size (1 = one transaction per write)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, "bench.db")
+    make_db(db_path, args.orders)
+    db_manager.DB_PATH = db_path
+    db_manager._writer = db_manager.OrderWriter(db_path, batch_size=args.batch_size)
+
+    order_ids = list(range(1, args.orders + 1))
+    cancel_wins = {order_id: 0 for order_id in order_ids}
+    written_comments = set()
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(args.writers + 1)
+
+    def writer(w):
+        # Writers start at different orders so they collide on every row in every order.
+        own = order_ids[w % len(order_ids):] + order_ids[:w % len(order_ids)]
+        start_barrier.wait()
+        for round_no in range(args.rounds):
+            for order_id in own:
+                # Read-modify-write in one statement: concurrent increments must all land.
+                db_manager._write("UPDATE food_orders SET edits = edits + 1 WHERE id = ?", (order_id,))
+                text = f"w{w}-r{round_no}"
+                with lock:
+                    written_comments.add(text)
+                db_manager.comment_order(order_id, f"w{w}", text)
+        # Every writer tries to cancel every order; only one may win each.
+        for order_id in order_ids:
+            if "successfully canceled" in db_manager.cancel_order(order_id, "0912"):
+                with lock:
+                    cancel_wins[order_id] += 1
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(args.writers)]
+    for t in threads:
+        t.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    w = db_manager._writer
+    w.close()
+
+    connection = sqlite3.connect(db_path)
+    rows = dict(
+        (order_id, (status, comment, edits))
+        for order_id, status, comment, edits in connection.execute(
+            "SELECT id, status, comment, edits FROM food_orders"
+        )
+    )
+    connection.close()
+
+    double_cancels = sum(1 for n in cancel_wins.values() if n > 1)
+    missed_cancels = sum(1 for n in cancel_wins.values() if n == 0)
+    not_canceled = sum(1 for status, _, _ in rows.values() if status != "canceled")
+    expected_edits = args.writers * args.rounds
+    lost_updates = sum(expected_edits - edits for _, _, edits in rows.values())
+    bad_comments = sum(1 for _, comment, _ in rows.values() if comment not in written_comments)
+
+    print(f"writers={args.writers} orders={args.orders} batch_size={args.batch_size}")
+    print(f"writes={w.statements} transactions={w.transactions} "
+          f"avg_batch={w.statements / max(w.transactions, 1):.1f}")
+    print(f"elapsed={elapsed:.3f}s throughput={w.statements / elapsed:.0f} writes/s")
+    print(f"double_cancels={double_cancels} missed_cancels={missed_cancels} "
+          f"not_canceled={not_canceled}")
+    print(f"lost_updates={lost_updates} (expected {expected_edits} edits per order) bad_comments={bad_comments}")
+    tmp.cleanup()
+
+    ok = double_cancels == missed_cancels == not_canceled == lost_updates == bad_comments == 0
+    print("OK" if ok else "FAILED")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
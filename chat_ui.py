@@ -1,33 +1,53 @@
 # chat_ui.py
 import os
 import sys
-import uuid
+import asyncio
 from dotenv import load_dotenv
 
 # Ensure local imports work
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 import chainlit as cl
-from router.module_identifier import identify_module
-from main import (
-    run_food_info,
-    run_food_suggestion,
-    run_food_services_module,
-)
+from chainlit.server import app
+from fastapi.responses import JSONResponse
+from main import handle_message, start_session, metrics
+from warmup import start_warmup, readiness
 
 load_dotenv()
 
-EXIT_WORDS = {"exit", "quit", "bye", "goodbye"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe for the load balancer: 200 once warm-up has finished, 503 before."""
+    report = readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime counters (food_info latency percentiles, degraded answers ...) as JSON."""
+    return JSONResponse(metrics())
+
+
+# Chainlit serves its frontend from a catch-all route; move ours in front of it.
+_own_routes = [route for route in app.router.routes if getattr(route, "path", None) in ("/ready", "/metrics")]
+for route in _own_routes:
+    app.router.routes.remove(route)
+app.router.routes[:0] = _own_routes
+
+# Load models, open LanceDB, prime the menu and compile graphs before the first user arrives.
+start_warmup()
+
+
+def _session_id():
+    # Chainlit's thread id survives reconnects to another node; fall back to the socket session id.
+    session = cl.context.session
+    return getattr(session, "thread_id", None) or session.id
 
 
 @cl.on_chat_start
 async def on_start():
-    cl.user_session.set("services_thread_id", str(uuid.uuid4()))
-    cl.user_session.set(
-        "suggestion_thread",
-        {"configurable": {"thread_id": str(uuid.uuid4())}}
-    )
-    cl.user_session.set("current_module", None)
+    await asyncio.to_thread(start_session, _session_id())
 
     await cl.Message(
         content=(
@@ -40,52 +60,11 @@ async def on_start():
 
 @cl.on_message
 async def on_message(message: cl.Message):
-    text = (message.content or "").strip()
-    if not text:
-        await cl.Message(content="⚠️ Please type something.").send()
-        return
-
-    # Release sticky module
-    if text.lower() in EXIT_WORDS:
-        cl.user_session.set("current_module", None)
-        await cl.Message(content="✅ Current module released.").send()
-        return
-
-    current_module = cl.user_session.get("current_module")
-    services_thread_id = cl.user_session.get("services_thread_id")
-    suggestion_thread = cl.user_session.get("suggestion_thread")
-
-    # Identify module if none is active
-    if current_module is None:
-        module_name = identify_module(text)
-        if module_name == "irrelevant":
-            await cl.Message(
-                content="⚠️ I can only answer food-related questions (recipes, ingredients, nutrition, restaurants, ordering)."
-            ).send()
-            return
-        cl.user_session.set("current_module", module_name)
-        current_module = module_name
-        await cl.Message(content=f"🔎 Module selected: **{module_name}**").send()
+    async def send(content):
+        await cl.Message(content=content).send()
 
     try:
-        if current_module == "food_info":
-            reply = run_food_info(text)
-            await cl.Message(content=reply).send()
-            cl.user_session.set("current_module", None)
-
-        elif current_module == "food_suggestion":
-            reply = run_food_suggestion(text, suggestion_thread)
-            await cl.Message(content=reply).send()
-            cl.user_session.set("current_module", None)
-
-        elif current_module == "food_services":
-            reply = run_food_services_module(text, services_thread_id)
-            await cl.Message(content=reply).send()
-
-        else:
-            await cl.Message(content="❓ Could not determine the right module.").send()
-            cl.user_session.set("current_module", None)
-
+        await handle_message(_session_id(), message.content, send)
     except Exception as e:
         await cl.Message(content=f"⚠️ Error: {e}").send()
 
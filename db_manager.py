@@ -1,130 +1,311 @@
 import sqlite3
 import Levenshtein
 import atexit
+import heapq
+import json
+import queue
+import re
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 
 
-# atexit.register(lambda: connection.close())
+DB_PATH = 'food_orders.db'
 
+# Max number of queued writes committed together in one transaction.
+WRITE_BATCH_SIZE = 64
 
+# Seconds a caller waits for its write to be committed.
+WRITE_TIMEOUT = 30
 
-def food_search(food_name=None, restaurant_name=None, max_distance=1):
+# Max number of foods returned by one food_search call (ask again with next_cursor for more).
+FOOD_SEARCH_LIMIT = 20
+# Max edit distance for a food_search match.
+FOOD_SEARCH_MAX_DISTANCE = 1
+# Approximate token budget for one food_search result.
+FOOD_SEARCH_MAX_TOKENS = 600
+
+
+class OrderWriter:
+    """
+    Single writer thread that owns the only write connection to the database.
+    Mutations are queued and every burst is group-committed in one transaction,
+    so concurrent sessions never fight over SQLite's write lock.
+    """
+
+    def __init__(self, db_path, batch_size=WRITE_BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.transactions = 0
+        self.statements = 0
+        self.thread = threading.Thread(target=self._run, name="order-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, sql, params=(), timeout=None):
+        """
+        Queue one statement and wait for it to be committed.
+        :param sql: A single (conditional) write statement, optionally with RETURNING
+        :param params: Statement parameters
+        :param timeout: Seconds to wait (default WRITE_TIMEOUT)
+        :return: Rows returned by the statement
+        :raises TimeoutError: if the write was not committed in time; it is dropped if it had not started yet
+        """
+        if timeout is None:
+            timeout = WRITE_TIMEOUT
+        future = Future()
+        self.queue.put((sql, params, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:  # not the builtin TimeoutError before Python 3.11
+            future.cancel()
+            raise TimeoutError(f"Database write not committed within {timeout} seconds.")
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    def _run(self):
+        connection = None
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [item for item in batch if item is not None]
+            # Writes whose caller already gave up (timed out) are dropped.
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            # Nothing may escape this loop: a dead writer would hang every later write.
+            try:
+                if connection is None:
+                    connection = self._connect()
+                results = self._commit(connection, batch)
+            except Exception as e:
+                try:
+                    if connection is not None and connection.in_transaction:
+                        connection.rollback()
+                except Exception:
+                    connection.close()
+                    connection = None
+                results = [(future, None, e) for _, _, future in batch]
+
+            self.transactions += 1
+            self.statements += len(batch)
+            for future, rows, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(rows)
+
+        if connection is not None:
+            connection.close()
+
+    def _commit(self, connection, batch):
+        cursor = connection.cursor()
+        results = []
+        cursor.execute("BEGIN IMMEDIATE")
+        for sql, params, future in batch:
+            try:
+                cursor.execute(sql, params)
+                results.append((future, cursor.fetchall(), None))
+            except Exception as e:
+                # A failed statement (bad SQL, out-of-range parameter ...) changes nothing;
+                # the rest of the batch still commits.
+                results.append((future, None, e))
+        cursor.execute("COMMIT")
+        return results
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the process-wide OrderWriter, starting it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = OrderWriter(DB_PATH)
+            atexit.register(_writer.close)
+        return _writer
+
+
+def _write(sql, params=()):
+    return get_writer().submit(sql, params)
+
+
+
+def encode_cursor(sort_key):
+    return json.dumps(list(sort_key), separators=(",", ":"))
+
+
+def decode_cursor(cursor):
+    """Sort key encoded in `cursor`, or None if it isn't a (distance, id) pair produced by encode_cursor."""
+    if not cursor:
+        return None
+    try:
+        sort_key = json.loads(cursor)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(sort_key, list) or len(sort_key) != 2:
+        return None
+    if not all(isinstance(n, (int, float)) and not isinstance(n, bool) for n in sort_key):
+        return None
+    return tuple(sort_key)
+
+
+def cap_output(lines, max_tokens):
+    """How many of `lines` fit in roughly max_tokens tokens (~4 characters per token); at least one."""
+    used = 0
+    for n, line in enumerate(lines):
+        used += len(line) // 4 + 1
+        if used > max_tokens:
+            return max(n, 1)
+    return len(lines)
+
+
+def select_top_k(scored, limit, cursor=None):
+    """
+    Pick the `limit` best items with a heap instead of sorting every match.
+    :param scored: Iterable of (sort_key, item); sort keys must be unique, so end them with a row id
+    :param limit: Page size
+    :param cursor: next_cursor of the previous page, to continue right after it
+    :return: (page, next_cursor); next_cursor is None on the last page
+    """
+    after = decode_cursor(cursor)
+    if after is not None:
+        scored = (pair for pair in scored if pair[0] > after)
+    best = heapq.nsmallest(limit + 1, scored, key=lambda pair: pair[0])
+    page = best[:limit]
+    next_cursor = encode_cursor(page[-1][0]) if len(best) > limit else None
+    return [item for _, item in page], next_cursor
+
+
+def food_search(food_name=None, restaurant_name=None, cursor=None):
     """
     Search for foods based on food_name, restaurant_name, or both using edit distance.
-    :param connection: SQLite database connection
+    Returns at most FOOD_SEARCH_LIMIT foods and about FOOD_SEARCH_MAX_TOKENS tokens per call.
     :param food_name: Food name to search for (optional)
     :param restaurant_name: Restaurant name to search for (optional)
-    :param max_distance: Maximum allowed edit distance for a match
-    :return: List of matching foods
+    :param cursor: next_cursor from a previous call, to show more results
+    :return: {"matches": best matching foods, "next_cursor": cursor for more results or None}
     """
-    connection = sqlite3.connect('food_orders.db')
+    # Not parameters on purpose: this is an LLM tool, and the model must not be able to widen them.
+    max_distance = FOOD_SEARCH_MAX_DISTANCE
+    limit = FOOD_SEARCH_LIMIT
+    connection = sqlite3.connect(DB_PATH)
+    rows = connection.execute("SELECT id, food_name, food_category, restaurant_name, price FROM foods")
 
-    cursor = connection.cursor()
-    cursor.execute("SELECT id, food_name, food_category, restaurant_name, price FROM foods")
-    results = cursor.fetchall()
-
-    matches = []
-    for food_id, db_food_name, food_category, db_restaurant_name, db_price in results:
-        food_name_distance = float('inf')
-        restaurant_name_distance = float('inf')
-
-        if food_name:
-            food_name_distance_1 = Levenshtein.distance(food_name.lower(), db_food_name.lower(), weights=(0, 1, 1))
-            food_name_distance_2 = Levenshtein.distance(food_name.lower(), db_food_name.lower(), weights=(1, 0, 1))
-            food_name_distance_3 = Levenshtein.distance(food_name.lower(), db_food_name.lower(), weights=(1, 1, 1))
-            food_name_distance = min(food_name_distance_1, food_name_distance_2, food_name_distance_3)
+    def matches():
+        # Rows are streamed and scored one by one; only the top `limit` are kept.
+        for food_id, db_food_name, food_category, db_restaurant_name, db_price in rows:
+            food_name_distance = float('inf')
+            restaurant_name_distance = float('inf')
+
+            if food_name:
+                food_name_distance_1 = Levenshtein.distance(food_name.lower(), db_food_name.lower(), weights=(0, 1, 1))
+                food_name_distance_2 = Levenshtein.distance(food_name.lower(), db_food_name.lower(), weights=(1, 0, 1))
+                food_name_distance_3 = Levenshtein.distance(food_name.lower(), db_food_name.lower(), weights=(1, 1, 1))
+                food_name_distance = min(food_name_distance_1, food_name_distance_2, food_name_distance_3)
             
 
-        if restaurant_name:
-            restaurant_name_distance_1 = Levenshtein.distance(restaurant_name.lower(), db_restaurant_name.lower(), weights=(0, 1, 1))
-            restaurant_name_distance_2 = Levenshtein.distance(restaurant_name.lower(), db_restaurant_name.lower(), weights=(1, 0, 1))
-            restaurant_name_distance_3 = Levenshtein.distance(restaurant_name.lower(), db_restaurant_name.lower(), weights=(1, 1, 1))
+            if restaurant_name:
+                restaurant_name_distance_1 = Levenshtein.distance(restaurant_name.lower(), db_restaurant_name.lower(), weights=(0, 1, 1))
+                restaurant_name_distance_2 = Levenshtein.distance(restaurant_name.lower(), db_restaurant_name.lower(), weights=(1, 0, 1))
+                restaurant_name_distance_3 = Levenshtein.distance(restaurant_name.lower(), db_restaurant_name.lower(), weights=(1, 1, 1))
             
-            restaurant_name_distance = min(restaurant_name_distance_1, restaurant_name_distance_2, restaurant_name_distance_3)
+                restaurant_name_distance = min(restaurant_name_distance_1, restaurant_name_distance_2, restaurant_name_distance_3)
             
-        if food_name and restaurant_name:
-            if food_name_distance <= max_distance and restaurant_name_distance <= max_distance:
-                matches.append({
-                    'id': food_id,
-                    'food_name': db_food_name,
-                    'food_category': food_category,
-                    'restaurant_name': db_restaurant_name,
-                    'price': db_price,
-                    'edit_distance': min(food_name_distance, restaurant_name_distance)
-                })
-        elif food_name:
-            if food_name_distance <= max_distance:
-                matches.append({
-                    'id': food_id,
-                    'food_name': db_food_name,
-                    'food_category': food_category,
-                    'restaurant_name': db_restaurant_name,
-                    'price': db_price,
-                    'edit_distance': food_name_distance
-                })
-        elif restaurant_name:
-            if restaurant_name_distance <= max_distance:
-                matches.append({
-                    'id': food_id,
-                    'food_name': db_food_name,
-                    'food_category': food_category,
-                    'restaurant_name': db_restaurant_name,
-                    'price': db_price,
-                    'edit_distance': restaurant_name_distance
-                })
-
-    matches.sort(key=lambda x: x['edit_distance'])
+            if food_name and restaurant_name:
+                if food_name_distance <= max_distance and restaurant_name_distance <= max_distance:
+                    edit_distance = min(food_name_distance, restaurant_name_distance)
+                else:
+                    continue
+            elif food_name:
+                if food_name_distance <= max_distance:
+                    edit_distance = food_name_distance
+                else:
+                    continue
+            elif restaurant_name:
+                if restaurant_name_distance <= max_distance:
+                    edit_distance = restaurant_name_distance
+                else:
+                    continue
+            else:
+                continue
+
+            # Ties are broken by id so pages are stable between calls.
+            yield (edit_distance, food_id), {
+                'id': food_id,
+                'food_name': db_food_name,
+                'food_category': food_category,
+                'restaurant_name': db_restaurant_name,
+                'price': db_price,
+                'edit_distance': edit_distance
+            }
+
+    page, next_cursor = select_top_k(matches(), limit, cursor)
     connection.close()
-    return matches
+
+    shown = cap_output([json.dumps(food) for food in page], FOOD_SEARCH_MAX_TOKENS)
+    if shown < len(page):
+        last = page[shown - 1]
+        next_cursor = encode_cursor((last["edit_distance"], last["id"]))
+        page = page[:shown]
+    return {"matches": page, "next_cursor": next_cursor}
 
 
 def cancel_order(order_id, phone_number):
     """
     Cancel an order if its status is 'preparation'.
-    :param connection: SQLite database connection
     :param order_id: ID of the order to cancel
+    :param phone_number: Phone number the order was placed with
     :return: Result message
     """
-    connection = sqlite3.connect('food_orders.db')
+    canceled = _write(
+        "UPDATE food_orders SET status = 'canceled' "
+        "WHERE id = ? AND person_phone_number = ? AND status = 'preparation' RETURNING id",
+        (order_id, phone_number),
+    )
+    if canceled:
+        return f"Order ID {order_id} from {phone_number} has been successfully canceled."
+
+    # Nothing was updated: read the row only to explain why.
+    connection = sqlite3.connect(DB_PATH)
     cursor = connection.cursor()
-    
-    cursor.execute("SELECT status FROM food_orders WHERE id = ? AND person_phone_number = ?", (order_id,phone_number))
+    cursor.execute("SELECT status FROM food_orders WHERE id = ? AND person_phone_number = ?", (order_id, phone_number))
     result = cursor.fetchone()
-    
+    connection.close()
+
     if result is None:
         return f"Order ID {order_id} from {phone_number} does not exist."
-    
-    current_status = result[0]
-    
-    if current_status == "preparation":
-        cursor.execute("UPDATE food_orders SET status = 'canceled' WHERE id = ?", (order_id,))
-        connection.commit()
-        connection.close()
-        return f"Order ID {order_id} from {phone_number} has been successfully canceled."
-    else:
-        connection.close()
-        return f"Order ID {order_id} from {phone_number} cannot be canceled as it is in '{current_status}' status."
+    return f"Order ID {order_id} from {phone_number} cannot be canceled as it is in '{result[0]}' status."
 
 
 def comment_order(order_id, person_name ,comment):
     """
     Add or overwrite a comment for an order.
-    :param connection: SQLite database connection
     :param order_id: ID of the order to comment on
+    :param person_name: Name of the person leaving the comment
     :param comment: The comment to add or overwrite
     :return: Result message
     """
-    connection = sqlite3.connect('food_orders.db')
-    cursor = connection.cursor()
-    
-    cursor.execute("SELECT id FROM food_orders WHERE id = ?", (order_id,))
-    result = cursor.fetchone()
-    
-    if result is None:
+    updated = _write("UPDATE food_orders SET comment = ? WHERE id = ? RETURNING id", (comment, order_id))
+    if not updated:
         return f"Order ID {order_id} does not exist."
-    
-    cursor.execute("UPDATE food_orders SET comment = ? WHERE id = ?", (comment, order_id))
-    connection.commit()
-    connection.close()
     return f"Comment for Order ID {order_id} from {person_name} has been updated."
 
 
@@ -135,7 +316,7 @@ def check_order_status(order_id):
     :param order_id: ID of the order to check
     :return: Order status or an error message
     """
-    connection = sqlite3.connect('food_orders.db')
+    connection = sqlite3.connect(DB_PATH)
     cursor = connection.cursor()
     
     cursor.execute("SELECT status FROM food_orders WHERE id = ?", (order_id,))
@@ -144,4 +325,76 @@ def check_order_status(order_id):
     if result is None:
         return f"Order ID {order_id} does not exist."
     
-    return f"Order ID {order_id} from is currently in '{result[0]}' status."
\ No newline at end of file
+    return f"Order ID {order_id} from is currently in '{result[0]}' status."
+
+
+def _order_id_list(order_ids):
+    """Normalize a list of order IDs (or free text such as "87, 88 and 91"), dropping duplicates."""
+    if isinstance(order_ids, (str, int)):
+        order_ids = [order_ids]
+    return list(dict.fromkeys(int(n) for i in order_ids for n in re.findall(r"\d+", str(i))))
+
+
+def check_orders_status(order_ids: list[int]):
+    """
+    Check the status of several orders with a single query.
+    :param order_ids: List of order IDs to check
+    :return: One line per order ID with its status or an error message
+    """
+    order_ids = _order_id_list(order_ids)
+    if not order_ids:
+        return "No order IDs were given."
+
+    connection = sqlite3.connect(DB_PATH)
+    cursor = connection.cursor()
+
+    placeholders = ",".join("?" * len(order_ids))
+    cursor.execute(f"SELECT id, status FROM food_orders WHERE id IN ({placeholders})", order_ids)
+    statuses = dict(cursor.fetchall())
+    connection.close()
+
+    lines = ["Order ID | Status"]
+    for order_id in order_ids:
+        lines.append(f"{order_id} | {statuses.get(order_id, 'does not exist')}")
+    return "\n".join(lines)
+
+
+def cancel_orders(order_ids: list[int], phone_number):
+    """
+    Cancel several orders with one conditional update; only orders in 'preparation' status are canceled.
+    :param order_ids: List of order IDs to cancel
+    :param phone_number: Phone number the orders were placed with
+    :return: One line per order ID with the result
+    """
+    order_ids = _order_id_list(order_ids)
+    if not order_ids:
+        return "No order IDs were given."
+
+    placeholders = ",".join("?" * len(order_ids))
+    canceled = {row[0] for row in _write(
+        f"UPDATE food_orders SET status = 'canceled' WHERE id IN ({placeholders}) "
+        "AND person_phone_number = ? AND status = 'preparation' RETURNING id",
+        order_ids + [phone_number],
+    )}
+
+    statuses = {}
+    rest = [order_id for order_id in order_ids if order_id not in canceled]
+    if rest:
+        connection = sqlite3.connect(DB_PATH)
+        cursor = connection.cursor()
+        cursor.execute(
+            f"SELECT id, status FROM food_orders WHERE id IN ({','.join('?' * len(rest))}) AND person_phone_number = ?",
+            rest + [phone_number],
+        )
+        statuses = dict(cursor.fetchall())
+        connection.close()
+
+    lines = [f"Order ID | Result (phone {phone_number})"]
+    for order_id in order_ids:
+        if order_id in canceled:
+            lines.append(f"{order_id} | canceled")
+        elif order_id not in statuses:
+            lines.append(f"{order_id} | does not exist")
+        else:
+            lines.append(f"{order_id} | cannot be canceled ('{statuses[order_id]}' status)")
+    return "\n".join(lines)
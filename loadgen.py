@@ -0,0 +1,285 @@
+# loadgen.py
+"""
+Load generator: replays chat sessions from a JSONL file through main.handle_message,
+the same path the Chainlit UI (chat_ui.on_message) uses.
+
+Each line is one user turn:
+    {"session": "s1", "text": "what's the status of order 87?"}
+    {"session": "s1", "text": "and 88?"}
+    {"session": "s2", "text": "which restaurants have pizza?", "module": "food_services"}
+
+Turns of the same session are sent one after another, in file order; sessions
+arrive at --rate per second (Poisson) with at most --concurrency running at once.
+Lines without "session" are single-turn sessions.
+
+With --fake-llm every ChatOpenAI client is replaced by a fake chat model that
+waits --fake-latency seconds per call and returns a plausible answer (module name,
+tool call, structured output or text). Everything else runs for real: graphs,
+DB tools, single-flight, embeddings and LanceDB retrieval, session store, threads
+and event loop. So worker counts can be sized without API calls; the knowledge
+base must already be built. The optional "module" field tells the fake router
+where to send a turn.
+
+Usage:
+    python loadgen.py sessions.jsonl --concurrency 20 --rate 5 --fake-llm
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def load_sessions(path):
+    sessions = defaultdict(list)
+    with open(path) as f:
+        for n, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            turn = json.loads(line)
+            sessions[str(turn.get("session", f"line-{n}"))].append(turn)
+    return list(sessions.values())
+
+
+# Structured outputs the fake LLM returns, by schema name.
+FAKE_STRUCTURED = {
+    "RouteQuery": {"datasource": "vectorstore"},
+    "SearchParams": {"include_keywords": ["pizza"], "guessed_food_names": ["pizza", "kebab", "salad"]},
+    "GradeDocuments": {"binary_score": "yes"},
+    "GradeHallucinations": {"binary_score": "yes"},
+    "GradeAnswer": {"binary_score": "yes"},
+}
+
+
+def install_fake_llm(latency):
+    """
+    Replace langchain_openai.ChatOpenAI with a fake chat model that sleeps about `latency`
+    seconds per call. Must run before main (and the modules) are imported, since they build
+    their LLM clients at import time. Everything else runs for real: router, graphs, tool
+    calls against the DB, single-flight, embeddings and LanceDB retrieval.
+    :return: dict of user text -> module, used by the fake router for turns with a "module" field
+    """
+    import langchain_openai
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+    from langchain_core.runnables import RunnableLambda
+
+    hints = {}
+
+    def wait():
+        time.sleep(random.uniform(0.5, 1.5) * latency)
+
+    def route(text):
+        if text in hints:
+            return hints[text]
+        lowered = text.lower()
+        if any(w in lowered for w in ("order", "cancel", "status", "restaurant", "price", "comment")):
+            return "food_services"
+        if any(w in lowered for w in ("suggest", "recommend", "something", "craving")):
+            return "food_suggestion"
+        return "food_info"
+
+    def tool_call(tools, text):
+        """First assistant turn: call one of the bound tools the way the real model typically would."""
+        numbers = re.findall(r"\d+", text)
+        if "combined_food_search" in tools:
+            return "combined_food_search", {"user_input": text}
+        if numbers and "check_orders_status" in tools:
+            return "check_orders_status", {"order_ids": " ".join(numbers)}
+        if "food_search" in tools:
+            words = re.findall(r"[a-z]+", text.lower()) or ["pizza"]
+            # Users usually end with the dish: "which restaurants have pizza?"
+            return "food_search", {"food_name": words[-1]}
+        return None
+
+    class FakeChatModel(BaseChatModel):
+        @property
+        def _llm_type(self):
+            return "fake-openai"
+
+        def __init__(self, **kwargs):
+            # Accept (and ignore) ChatOpenAI's arguments: model, api key, temperature, timeout ...
+            super().__init__()
+
+        def bind_tools(self, tools, **kwargs):
+            return self.bind(fake_tools=[getattr(t, "name", None) or t.__name__ for t in tools])
+
+        def with_structured_output(self, schema, **kwargs):
+            def invoke(_):
+                wait()
+                return schema(**FAKE_STRUCTURED.get(schema.__name__, {}))
+
+            return RunnableLambda(invoke)
+
+        def _generate(self, messages, stop=None, run_manager=None, fake_tools=None, **kwargs):
+            wait()
+            last = messages[-1]
+            text = last.content if isinstance(last.content, str) else str(last.content)
+            request = re.search(r"User request: (.*)\nAnswer:", text)
+            # After a tool result the assistant answers in text, which ends the tool loop.
+            call = tool_call(fake_tools, text) if fake_tools and last.type != "tool" else None
+            if request:
+                # module_identifier's routing prompt
+                message = AIMessage(content=route(request.group(1).strip()))
+            elif call:
+                name, args = call
+                message = AIMessage(
+                    content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}]
+                )
+            else:
+                message = AIMessage(content=f"(fake answer to: {text[-200:]})")
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+    langchain_openai.ChatOpenAI = FakeChatModel
+    return hints
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None if it can't be measured here."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, KB on Linux
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def run(args):
+    hints = {}
+    if args.fake_llm:
+        # Clients are still constructed at import time (they are never called in fake mode).
+        os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+        os.environ.setdefault("TAVILY_API_KEY", "tvly-fake")
+        hints = install_fake_llm(args.fake_latency)
+    import main
+
+    sessions = load_sessions(args.input) * args.repeat
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max(32, args.concurrency * 4), thread_name_prefix="loadgen")
+    )
+    limit = asyncio.Semaphore(args.concurrency)
+    run_id = uuid.uuid4().hex[:8]
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    async def run_session(n, turns):
+        session_id = f"loadgen-{run_id}-{n}"
+        async with limit:
+            await asyncio.to_thread(main.start_session, session_id)
+            for turn in turns:
+                if turn.get("module"):
+                    hints[turn["text"]] = turn["module"]
+                start = time.perf_counter()
+                module = "unknown"
+                try:
+                    module, _ = await main.handle_message(session_id, turn["text"])
+                    module = module or "none"
+                except Exception as e:
+                    # handle_message tags errors with the module that was running.
+                    module = getattr(e, "module", module)
+                    errors[module] += 1
+                    if args.verbose:
+                        print(f"[{session_id}] error: {e}", file=sys.stderr)
+                latencies[module].append(time.perf_counter() - start)
+                if args.think_time:
+                    await asyncio.sleep(args.think_time)
+
+    started = time.perf_counter()
+    tasks = []
+    for n, turns in enumerate(sessions):
+        tasks.append(asyncio.create_task(run_session(n, turns)))
+        if args.rate:
+            await asyncio.sleep(random.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(v) for v in latencies.values())
+    report = {
+        "sessions": len(sessions),
+        "turns": total,
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "fake_llm": args.fake_llm,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_turns_per_s": round(total / elapsed, 2) if elapsed else None,
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "modules": {
+            module: {
+                "turns": len(samples),
+                "errors": errors[module],
+                "error_rate": round(errors[module] / len(samples), 4),
+                "p50_s": round(percentile(samples, 0.50), 3),
+                "p95_s": round(percentile(samples, 0.95), 3),
+                "p99_s": round(percentile(samples, 0.99), 3),
+            }
+            for module, samples in sorted(latencies.items())
+        },
+        # The app's own counters (same as the server's /metrics).
+        "app_metrics": main.metrics(),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of user turns")
+    parser.add_argument("--concurrency", type=int, default=10, help="max sessions running at once")
+    parser.add_argument("--rate", type=float, default=0.0, help="session arrivals per second (0 = all at once)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the file this many times")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between turns of a session")
+    parser.add_argument("--fake-llm", action="store_true", help="replace LLM calls with sleeping stand-ins")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="mean stand-in latency in seconds")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"sessions={report['sessions']} turns={report['turns']} concurrency={report['concurrency']} "
+          f"rate={report['rate']} fake_llm={report['fake_llm']}")
+    print(f"elapsed={report['elapsed_s']}s throughput={report['throughput_turns_per_s']} turns/s "
+          f"error_rate={report['error_rate']} peak_rss={report['peak_rss_mb'] or 'n/a'} MB")
+    print(f"{'module':<16}{'turns':>7}{'errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for module, m in report["modules"].items():
+        print(f"{module:<16}{m['turns']:>7}{m['errors']:>8}{m['p50_s']:>9}{m['p95_s']:>9}{m['p99_s']:>9}")
+    latency = report["app_metrics"]["food_info_latency"]
+    print(f"food_info answers: count={latency['count']} degraded={latency['degraded']} "
+          f"p50={latency['p50']} p95={latency['p95']} p99={latency['p99']}")
+    speculation = report["app_metrics"]["speculative_retrieval"]
+    if speculation["enabled"]:
+        print(f"speculative retrieval: started={speculation['started']} hit_rate={speculation['hit_rate']:.2f} "
+              f"wasted={speculation['wasted_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,69 @@
 import uuid
 import io
 import sys
+import asyncio
+import threading
 from router.module_identifier import identify_module
 from langchain.schema import AIMessage
-from modules.food_info import FoodInfoModule
+from modules.food_info import FoodInfoModule, SPECULATIVE_RETRIEVAL, speculation_stats, latency_stats
 from modules.food_suggestion import graph
 from modules.food_services import run_turn  # (user_input, thread_id)
 from langchain_core.messages import HumanMessage
 from langchain_core.messages import HumanMessage, AIMessage
+from session_store import get_session_store, SessionBusy, VersionConflict
 
-def run_food_info(user_input: str) -> str:
-    food_module = FoodInfoModule()
-    return food_module.answer_question(user_input)
+EXIT_WORDS = {"exit", "quit", "bye", "goodbye"}
+IRRELEVANT_REPLY = "⚠️ I can only answer food-related questions (recipes, ingredients, nutrition, restaurants, ordering)."
+BUSY_REPLY = "⏳ I'm still working on your previous message; please wait for that answer first."
+
+_food_info_module = None
+_food_info_lock = threading.Lock()
+
+
+def get_food_info_module() -> FoodInfoModule:
+    # Built once per process: loading the embedding model and LanceDB is expensive.
+    # The lock stops the warm-up thread and an early request from both building it.
+    global _food_info_module
+    with _food_info_lock:
+        if _food_info_module is None:
+            _food_info_module = FoodInfoModule()
+    return _food_info_module
+
+
+def run_food_info(user_input: str, prefetched=None) -> str:
+    food_module = get_food_info_module()
+    return food_module.answer_question(user_input, prefetched)
+
+
+async def arun_food_info(user_input: str, prefetched=None) -> str:
+    # May wait for the warm-up to finish loading the model: keep that off the event loop.
+    food_module = await asyncio.to_thread(get_food_info_module)
+    return await food_module.answer_question_async(user_input, prefetched)
+
+
+def start_speculation(user_input: str):
+    """Start food_info retrieval while the router is still deciding (FOODCHAT_SPECULATIVE_RETRIEVAL=1)."""
+    if not SPECULATIVE_RETRIEVAL:
+        return None
+    return get_food_info_module().prefetch(user_input)
+
+
+def end_speculation(prefetched, module_name: str):
+    """Drop the speculative retrieval unless the question went to food_info."""
+    if prefetched is not None and module_name != "food_info":
+        prefetched.discard()
+        return None
+    return prefetched
+
+
+def metrics() -> dict:
+    """Runtime counters of this process, served at /metrics and included in the load generator report."""
+    return {
+        # End-to-end food_info answer latency (recent requests) and how many answers were degraded by the budget.
+        "food_info_latency": latency_stats.snapshot(),
+        # Speculative retrieval: hit rate and time spent on prefetches that were thrown away.
+        "speculative_retrieval": {"enabled": SPECULATIVE_RETRIEVAL, **speculation_stats.snapshot()},
+    }
 
 
 def run_food_suggestion(user_input: str, thread) -> str:
@@ -34,6 +86,113 @@ def run_food_suggestion(user_input: str, thread) -> str:
 def run_food_services_module(user_input: str, thread_id: str) -> str:
     return run_turn(user_input, thread_id) or "(No response)"
 
+def init_session(state: dict) -> dict:
+    state.setdefault("services_thread_id", str(uuid.uuid4()))
+    state.setdefault("suggestion_thread", {"configurable": {"thread_id": str(uuid.uuid4())}})
+    state["current_module"] = None
+    return state
+
+
+def start_session(session_id: str) -> None:
+    """Reset the session's sticky module when a chat (re)starts. Blocking: call it from a thread in async code."""
+    store = get_session_store()
+    try:
+        state, version = store.acquire(session_id, str(uuid.uuid4()))
+    except SessionBusy:
+        return  # a turn is running, so the session already exists
+    store.release(session_id, init_session(state), version)
+
+
+async def handle_message(session_id: str, text: str, send=None):
+    """Run one chat turn for a session (the Chainlit UI and the load generator both go through here).
+
+    Session state (sticky module, graph thread IDs) lives in the shared session store, so any
+    worker/node can serve the next message. The turn holds the session's lease from routing to
+    the final save, so two nodes never run turns of one session (and its graph threads) at once.
+    Blocking LLM/DB work, session store calls included, runs in threads so the event loop keeps
+    serving other sessions.
+    `send` (optional async callable) is awaited with each reply as soon as it is ready.
+    Returns (module_name, replies) where replies are the messages to show, in order.
+    """
+    replies = []
+
+    async def reply(content):
+        replies.append(content)
+        if send is not None:
+            await send(content)
+
+    text = (text or "").strip()
+    if not text:
+        await reply("⚠️ Please type something.")
+        return None, replies
+
+    store = get_session_store()
+    try:
+        state, version = await asyncio.to_thread(store.acquire, session_id, str(uuid.uuid4()))
+    except SessionBusy:
+        await reply(BUSY_REPLY)
+        return None, replies
+    if "services_thread_id" not in state:
+        init_session(state)
+
+    try:
+        return await _run_turn(state, text, reply), replies
+    except Exception as e:
+        # Tell callers (e.g. the load generator) which module failed; no module yet means routing did.
+        e.module = state.get("current_module") or "router"
+        raise
+    finally:
+        try:
+            await asyncio.to_thread(store.release, session_id, state, version)
+        except VersionConflict:
+            # Only possible if this turn outlived its lease and another node took the session over.
+            print(f"Session {session_id}: turn outlived its lease; its state changes were dropped.")
+
+
+async def _run_turn(state: dict, text: str, reply) -> str:
+    """Route and run one turn, updating state["current_module"] in place; returns the module used."""
+    # Release sticky module
+    if text.lower() in EXIT_WORDS:
+        state["current_module"] = None
+        await reply("✅ Current module released.")
+        return None
+
+    current_module = state.get("current_module")
+    prefetched = None
+
+    # Identify module if none is active
+    if current_module is None:
+        prefetched = await asyncio.to_thread(start_speculation, text)
+        module_name = None
+        try:
+            module_name = await asyncio.to_thread(identify_module, text)
+        finally:
+            # Also drops (and counts) the prefetch if routing failed.
+            prefetched = end_speculation(prefetched, module_name)
+        if module_name == "irrelevant":
+            await reply(IRRELEVANT_REPLY)
+            return module_name
+        state["current_module"] = current_module = module_name
+        await reply(f"🔎 Module selected: **{module_name}**")
+
+    if current_module == "food_info":
+        await reply(await arun_food_info(text, prefetched))
+        state["current_module"] = None
+
+    elif current_module == "food_suggestion":
+        await reply(await asyncio.to_thread(run_food_suggestion, text, state["suggestion_thread"]))
+        state["current_module"] = None
+
+    elif current_module == "food_services":
+        await reply(await asyncio.to_thread(run_food_services_module, text, state["services_thread_id"]))
+
+    else:
+        await reply("❓ Could not determine the right module.")
+        state["current_module"] = None
+
+    return current_module
+
+
 def main():
     print("Unified Food Assistant (type 'exit' or 'quit' to leave)")
 
@@ -45,12 +204,23 @@ def main():
     while True:
         user_input = input("\nYou: ").strip()
         if user_input.lower() in {"exit", "quit"}:
+            if SPECULATIVE_RETRIEVAL:
+                print(f"Speculative retrieval: {speculation_stats.snapshot()}")
+            if latency_stats.count:
+                print(f"food_info latency: {latency_stats.snapshot()}")
             print("Goodbye!")
             break
 
+        prefetched = None
+
         # Use module_identifier only if no module is active
         if current_module is None:
-            module_name = identify_module(user_input)
+            prefetched = start_speculation(user_input)
+            module_name = None
+            try:
+                module_name = identify_module(user_input)
+            finally:
+                prefetched = end_speculation(prefetched, module_name)
             print(module_name)
             if module_name == "irrelevant":
                 print("I can only answer food-related questions (recipes, ingredients, nutrition, restaurants, ordering).")
@@ -61,7 +231,7 @@ def main():
 
         # Run the active module
         if module_name == "food_info":
-            reply = run_food_info(user_input)
+            reply = run_food_info(user_input, prefetched)
             # After one response, release the module
             current_module = None
 
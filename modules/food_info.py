@@ -1,6 +1,11 @@
 import os
+import time
+import threading
 import warnings
-from typing import List
+from collections import deque
+from contextlib import closing
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, List
 from pydantic import BaseModel, Field
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
@@ -14,6 +19,8 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_tavily import TavilySearch
 from langchain_community.vectorstores import LanceDB
 from dotenv import load_dotenv
+from modules.model_server import connect_model_server, ServerConnection, RemoteEmbeddings, RemoteRetriever
+from modules.single_flight import SingleFlight, normalize_key
 
 load_dotenv()
 
@@ -46,6 +53,250 @@ def find_generation(output):
     return None
 
 
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+LANCEDB_PATH = "lancedb_path"
+TABLE_NAME = "food_knowledge_base"
+
+_embedding = None
+_embedding_lock = threading.Lock()
+_local = {"embedding": None, "retriever": None}
+_local_lock = threading.Lock()
+
+
+def get_embedding():
+    """
+    The process's embedding model, loaded once and shared by food_info and the menu index:
+    a client for the model server when one is running, otherwise bge-small in-process.
+    """
+    global _embedding
+    with _embedding_lock:
+        if _embedding is None:
+            service = connect_model_server()
+            if service is not None:
+                _embedding = RemoteEmbeddings(ServerConnection(service), fallback=get_local_embedding)
+            else:
+                _embedding = get_local_embedding()
+        return _embedding
+
+
+def get_local_embedding():
+    """bge-small loaded in this process (once); also used while the model server is unreachable."""
+    with _local_lock:
+        if _local["embedding"] is None:
+            _local["embedding"] = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        return _local["embedding"]
+
+
+def get_local_retriever():
+    """In-process knowledge-base retriever, opened on first use when the model server is unreachable."""
+    embedding = get_local_embedding()
+    with _local_lock:
+        if _local["retriever"] is None:
+            db, table = open_knowledge_table(embedding)
+            vectorstore = LanceDB(connection=db, table=table, embedding=embedding)
+            _local["retriever"] = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
+        return _local["retriever"]
+
+
+def open_knowledge_table(embedding):
+    """Open the LanceDB knowledge base table, building it from the PDF on first run."""
+    db = lancedb.connect(LANCEDB_PATH)
+
+    if TABLE_NAME in db.table_names():
+        return db, db.open_table(TABLE_NAME)
+
+    parser = LlamaParse(api_key=os.getenv("LLAMA_CLOUD_API_KEY"), result_type="markdown")
+    docs = parser.load_data("./The New Complete Book of Foods.pdf")
+
+    raw_text = "\n".join([d.text for d in docs]) if isinstance(docs, list) else docs.text
+    doc = Document(page_content=raw_text)
+    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=200,
+        chunk_overlap=25,
+        separators=["\n\n", "\n", ".", " "],
+    )
+    doc_splits = text_splitter.split_documents([doc])
+
+    texts = [chunk.page_content for chunk in doc_splits]
+    embeddings = embedding.embed_documents(texts)
+
+    table = db.create_table(
+        TABLE_NAME,
+        data=[{"text": chunk.page_content, "vector": vec} for chunk, vec in zip(doc_splits, embeddings)]
+    )
+    return db, table
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+# Start retrieval (query embedding + LanceDB search) while the routing LLM calls run.
+SPECULATIVE_RETRIEVAL = os.getenv("FOODCHAT_SPECULATIVE_RETRIEVAL", "0") == "1"
+
+_speculation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-retrieval")
+
+
+class SpeculationStats:
+    """Counters for speculative retrieval: how often it was used and how much work was thrown away."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.discarded = 0
+        self.wasted_seconds = 0.0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def snapshot(self):
+        with self.lock:
+            finished = self.hits + self.discarded
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "discarded": self.discarded,
+                "hit_rate": self.hits / finished if finished else 0.0,
+                "wasted_seconds": round(self.wasted_seconds, 3),
+            }
+
+
+speculation_stats = SpeculationStats()
+
+# Concurrent identical questions share one run of the answer pipeline.
+answer_flight = SingleFlight("food_info.answer_question")
+
+
+class PrefetchedRetrieval:
+    """Retrieval started before we know whether the question will be routed to the vectorstore."""
+
+    def __init__(self, retriever, question):
+        self.question = question
+        self.elapsed = 0.0
+        self.finished = False
+        speculation_stats.add(started=1)
+        self.future = _speculation_executor.submit(self._run, retriever, question)
+
+    def _run(self, retriever, question):
+        start = time.perf_counter()
+        try:
+            return retriever.invoke(question)
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+    def take(self, question, timeout=None):
+        """Return the prefetched documents, or None if they can't be used and must be fetched again."""
+        if self.finished or question != self.question:
+            self.discard()
+            return None
+        try:
+            documents = self.future.result(timeout=timeout)
+        except FutureTimeout:
+            raise DeadlineExceeded()
+        except Exception:
+            self.finished = True
+            speculation_stats.add(discarded=1, wasted_seconds=self.elapsed)
+            return None
+        self.finished = True
+        speculation_stats.add(hits=1)
+        return documents
+
+    def discard(self):
+        if self.finished:
+            return
+        self.finished = True
+        if self.future.cancel():
+            speculation_stats.add(discarded=1)
+        else:
+            # Still running or done: count its run time as wasted once it finishes.
+            self.future.add_done_callback(
+                lambda _: speculation_stats.add(discarded=1, wasted_seconds=self.elapsed)
+            )
+
+
+# Latency budget for one food_info answer; nodes stop waiting once it is used up.
+ANSWER_BUDGET_SECONDS = float(os.getenv("FOODCHAT_FOOD_INFO_BUDGET", "20"))
+# How many times an empty retrieval is retried (with a rewritten question) before giving up.
+MAX_RETRIEVE_RETRIES = 2
+NOT_AVAILABLE_MESSAGE = "Sorry, I couldn't find that information in time. Please try again or rephrase your question."
+
+def remaining_time(state):
+    """Seconds left in the request's latency budget (None if it has no deadline)."""
+    deadline = state.get("deadline")
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _start_thread(fn, *args):
+    """
+    Run fn(*args) on its own thread. Node calls don't share a fixed-size pool, so calls
+    abandoned at their deadline can never make new requests queue behind them.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="food-info-node", daemon=True).start()
+    return future
+
+
+def call_with_deadline(state, fn, *args, stop=None):
+    """
+    Run fn(*args), giving up (DeadlineExceeded) when the request's latency budget runs out.
+    :param stop: threading.Event set on timeout, so fn can stop early (e.g. close an LLM stream)
+    """
+    timeout = remaining_time(state)
+    if timeout is not None and timeout <= 0:
+        raise DeadlineExceeded()
+    future = _start_thread(fn, *args)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        if stop is not None:
+            stop.set()
+        raise DeadlineExceeded()
+
+
+class LatencyStats:
+    """End-to-end answer latency over the most recent requests."""
+
+    def __init__(self, size=1000):
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.degraded = 0
+
+    def record(self, seconds, degraded=False):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+            self.degraded += int(degraded)
+
+    def snapshot(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            count, degraded = self.count, self.degraded
+        percentile = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 3) if samples else None
+        return {
+            "count": count,
+            "degraded": degraded,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+        }
+
+
+latency_stats = LatencyStats()
+
+
 class FoodInfoModule:
     def __init__(self):
         warnings.filterwarnings("ignore", category=FutureWarning)
@@ -55,10 +306,15 @@ class FoodInfoModule:
         TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
         OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 		
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-        self.embedding = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
+        # Requests abandoned at the deadline still end on their own within one budget.
+        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, timeout=ANSWER_BUDGET_SECONDS)
 
-        self.load_data()
+        # Use the shared model server when one is running, otherwise load everything in-process.
+        self.embedding = get_embedding()
+        if isinstance(self.embedding, RemoteEmbeddings):
+            self.retriever = RemoteRetriever(connection=self.embedding.connection, k=5, fallback=get_local_retriever)
+        else:
+            self.load_data()
 
         self.web_search_tool = TavilySearch(k=3)
 
@@ -69,32 +325,8 @@ class FoodInfoModule:
         self.build_graph()
 
     def load_data(self):
-        self.db = lancedb.connect("lancedb_path")
-        self.table_name = "food_knowledge_base"
-
-        if self.table_name in self.db.table_names():
-            self.table = self.db.open_table(self.table_name)
-        else:
-            parser = LlamaParse(api_key=os.getenv("LLAMA_CLOUD_API_KEY"), result_type="markdown")
-            docs = parser.load_data("./The New Complete Book of Foods.pdf")
-
-            raw_text = "\n".join([d.text for d in docs]) if isinstance(docs, list) else docs.text
-            doc = Document(page_content=raw_text)
-            text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-                chunk_size=200,
-                chunk_overlap=25,
-                separators=["\n\n", "\n", ".", " "],
-            )
-            self.doc_splits = text_splitter.split_documents([doc])
-
-            texts = [chunk.page_content for chunk in self.doc_splits]
-            embeddings = self.embedding.embed_documents(texts)
-
-            self.table = self.db.create_table(
-                self.table_name,
-                data=[{"text": chunk.page_content, "vector": vec} for chunk, vec in zip(self.doc_splits, embeddings)]
-            )
-
+        self.table_name = TABLE_NAME
+        self.db, self.table = open_knowledge_table(self.embedding)
         self.vectorstore = LanceDB(connection=self.db, table=self.table, embedding=self.embedding)
         self.retriever = self.vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
 
@@ -159,13 +391,28 @@ Question:
             question: str
             generation: str
             documents: List[str]
+            prefetched: Any
+            deadline: float
+            retries: int
+            search_query: str
+            degraded: bool
 
         self.GraphState = GraphState
 
         def retrieve(state):
             question = state["question"]
-            documents = self.retriever.invoke(question)
-            return {"documents": documents, "question": question}
+            query = state.get("search_query") or question
+            prefetched = state.get("prefetched")
+            try:
+                timeout = remaining_time(state)
+                if timeout is not None:
+                    timeout = max(timeout, 0)
+                documents = prefetched.take(query, timeout) if prefetched else None
+                if documents is None:
+                    documents = call_with_deadline(state, self.retriever.invoke, query)
+            except DeadlineExceeded:
+                documents = []
+            return {"documents": documents, "question": question, "prefetched": None}
 
         def generate(state):
             question = state["question"]
@@ -176,42 +423,85 @@ Question:
                 context = documents.page_content
             else:
                 context = str(documents)
-            generation = self.rag_chain.invoke({"context": context, "question": question})
+
+            # Stream the answer so that, if the budget runs out, we still have the part generated so far.
+            chunks = []
+            stop = threading.Event()
+
+            def run():
+                # Closing the stream on timeout ends the LLM request instead of letting it run to the end.
+                with closing(self.rag_chain.stream({"context": context, "question": question})) as stream:
+                    for chunk in stream:
+                        if stop.is_set():
+                            break
+                        chunks.append(chunk)
+
+            try:
+                call_with_deadline(state, run, stop=stop)
+            except DeadlineExceeded:
+                partial = "".join(chunks).strip()
+                generation = partial + " …" if partial else NOT_AVAILABLE_MESSAGE
+                return {"documents": documents, "question": question, "generation": generation, "degraded": True}
+            generation = "".join(chunks)
             return {"documents": documents, "question": question, "generation": generation}
 
         def grade_documents(state):
             documents = state["documents"]
             return {"documents": documents, "question": state["question"]}
 
+        def rewrite_question(state):
+            # Empty retrieval: try again with a rewritten query, at most MAX_RETRIEVE_RETRIES times.
+            question = state["question"]
+            try:
+                query = call_with_deadline(state, self.question_rewriter.invoke, {"question": question})
+            except DeadlineExceeded:
+                query = state.get("search_query") or question
+            return {"search_query": query, "retries": state.get("retries", 0) + 1}
+
         def route_question(state):
             question = state["question"]
-            source = self.question_router.invoke({"question": question})
-            route = source.datasource
+            prefetched = state.get("prefetched")
+            try:
+                source = call_with_deadline(state, self.question_router.invoke, {"question": question})
+                route = source.datasource
+            except DeadlineExceeded:
+                route = "timeout"
             print(route)
+            if prefetched and route != "vectorstore":
+                prefetched.discard()
             if route == "web_search":
                 return "web_search"
             elif route == "vectorstore":
                 return "retrieve"
+            elif route == "timeout":
+                return "unavailable"
             else:
                 return "irrelevant"
 
         def decide_to_generate(state):
             filtered_documents = state["documents"]
-            if not filtered_documents:
-                return "retrieve"
-            else:
+            if filtered_documents:
                 return "generate"
+            timeout = remaining_time(state)
+            if state.get("retries", 0) < MAX_RETRIEVE_RETRIES and (timeout is None or timeout > 0):
+                return "rewrite"
+            return "unavailable"
 
         def handle_irrelevant_question(state):
             return {"generation": "Sorry, this question is not related to food."}
 
+        def handle_unavailable(state):
+            return {"generation": NOT_AVAILABLE_MESSAGE, "degraded": True}
+
         self.workflow = StateGraph(self.GraphState)
 
         self.workflow.add_node("web_search", lambda state: {"documents": [], "question": state["question"]})  # simplified
         self.workflow.add_node("retrieve", retrieve)
         self.workflow.add_node("grade_documents", grade_documents)
+        self.workflow.add_node("rewrite", rewrite_question)
         self.workflow.add_node("generate", generate)
         self.workflow.add_node("irrelevant", handle_irrelevant_question)
+        self.workflow.add_node("unavailable", handle_unavailable)
 
         self.workflow.add_conditional_edges(
             START,
@@ -220,6 +510,7 @@ Question:
                 "web_search": "web_search",
                 "retrieve": "retrieve",
                 "irrelevant": "irrelevant",
+                "unavailable": "unavailable",
             },
         )
         self.workflow.add_edge("retrieve", "grade_documents")
@@ -227,10 +518,12 @@ Question:
             "grade_documents",
             decide_to_generate,
             {
-                "retrieve": "retrieve",
+                "rewrite": "rewrite",
                 "generate": "generate",
+                "unavailable": "unavailable",
             },
         )
+        self.workflow.add_edge("rewrite", "retrieve")
         self.workflow.add_conditional_edges(
             "generate",
             lambda state: END,
@@ -238,6 +531,7 @@ Question:
                 END: END,
             },
         )
+        self.workflow.add_edge("unavailable", END)
 
         self.app = self.workflow.compile()
 
@@ -250,14 +544,52 @@ Question:
         )
         self.question_rewriter = re_write_prompt | self.llm | StrOutputParser()
 
-    def answer_question(self, question: str) -> str:
-        inputs = {"question": question}
+    def prefetch(self, question: str) -> PrefetchedRetrieval:
+        """Start retrieving documents for `question` in the background; pass the result to answer_question."""
+        return PrefetchedRetrieval(self.retriever, question)
+
+    def answer_question(self, question: str, prefetched: PrefetchedRetrieval = None, budget: float = None) -> str:
+        try:
+            return answer_flight.do(normalize_key(question), self._answer_question, question, prefetched, budget)
+        finally:
+            # Only used if this call ran the pipeline; otherwise it is wasted work.
+            if prefetched:
+                prefetched.discard()
+
+    async def answer_question_async(self, question: str, prefetched: PrefetchedRetrieval = None,
+                                    budget: float = None) -> str:
+        try:
+            return await answer_flight.do_async(
+                normalize_key(question), self._answer_question, question, prefetched, budget
+            )
+        finally:
+            if prefetched:
+                prefetched.discard()
+
+    def _answer_question(self, question: str, prefetched: PrefetchedRetrieval = None, budget: float = None) -> str:
+        if prefetched is None and SPECULATIVE_RETRIEVAL:
+            prefetched = self.prefetch(question)
+        start = time.monotonic()
+        inputs = {
+            "question": question,
+            "prefetched": prefetched,
+            "deadline": start + (budget or ANSWER_BUDGET_SECONDS),
+            "retries": 0,
+        }
         final_answer = None
-        for output in self.app.stream(inputs):
-            gen = find_generation(output)
-            if gen:
-                final_answer = gen
-                break  
+        degraded = False
+        try:
+            # The retry loop is bounded by MAX_RETRIEVE_RETRIES; the recursion limit is only a backstop.
+            for output in self.app.stream(inputs, {"recursion_limit": 4 * MAX_RETRIEVE_RETRIES + 10}):
+                degraded = degraded or any(isinstance(v, dict) and v.get("degraded") for v in output.values())
+                gen = find_generation(output)
+                if gen:
+                    final_answer = gen
+                    break  
+        finally:
+            if prefetched:
+                prefetched.discard()
+            latency_stats.record(time.monotonic() - start, degraded)
         return final_answer or "no answer found."
 
 
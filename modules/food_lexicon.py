@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Rule-based extractor for food_suggestion search parameters.
+
+Most suggestion requests ("something italian without meat", "spicy chicken,
+no rice") only name cuisines, ingredients and things to avoid. This module
+turns such descriptions into the same parameter dict the LLM extractor
+produces (include_keywords / synonyms / exclude_keywords / guessed_food_names)
+using a curated lexicon, so the LLM is only needed when too much of the
+request is not understood.
+"""
+
+import re
+import sqlite3
+
+# canonical term -> synonyms (also matched in user text) and typical dish names
+LEXICON = {
+    # cuisines
+    "italian": {"synonyms": ["italy"], "dishes": ["pizza", "pasta", "lasagna", "risotto"]},
+    "persian": {"synonyms": ["iranian", "iran"], "dishes": ["kebab", "ghorme sabzi", "gheyme", "tahchin", "joojeh"]},
+    "chinese": {"synonyms": ["china"], "dishes": ["fried rice", "noodles", "dumplings"]},
+    "japanese": {"synonyms": ["japan"], "dishes": ["sushi", "ramen", "tempura"]},
+    "mexican": {"synonyms": ["mexico", "tex-mex"], "dishes": ["tacos", "burrito", "quesadilla", "nachos"]},
+    "indian": {"synonyms": ["india"], "dishes": ["curry", "biryani", "tikka masala"]},
+    "turkish": {"synonyms": [], "dishes": ["doner", "kebab", "lahmacun"]},
+    "american": {"synonyms": ["usa"], "dishes": ["burger", "hot dog", "fries"]},
+    "french": {"synonyms": ["france"], "dishes": ["croissant", "quiche", "crepe"]},
+    "fast food": {"synonyms": ["fastfood", "junk food"], "dishes": ["burger", "pizza", "fries", "sandwich", "hot dog"]},
+    "seafood": {"synonyms": ["sea food"], "dishes": ["fish", "shrimp"]},
+    # ingredients / dish types
+    "chicken": {"synonyms": ["poultry", "joojeh"], "dishes": []},
+    "beef": {"synonyms": ["steak"], "dishes": []},
+    "lamb": {"synonyms": ["mutton"], "dishes": []},
+    "meat": {"synonyms": ["meaty"], "dishes": []},
+    "fish": {"synonyms": ["salmon", "tuna", "mahi"], "dishes": []},
+    "shrimp": {"synonyms": ["prawn", "prawns", "meygoo"], "dishes": []},
+    "rice": {"synonyms": ["polo", "chelo"], "dishes": []},
+    "pasta": {"synonyms": ["spaghetti", "macaroni", "noodle", "noodles"], "dishes": []},
+    "pizza": {"synonyms": [], "dishes": []},
+    "hot dog": {"synonyms": ["hotdog", "sausage"], "dishes": []},
+    "burger": {"synonyms": ["hamburger", "cheeseburger", "burgers"], "dishes": []},
+    "sandwich": {"synonyms": ["sub", "wrap", "sandwiches"], "dishes": []},
+    "kebab": {"synonyms": ["kabab", "kabob", "kebob"], "dishes": []},
+    "salad": {"synonyms": ["salads"], "dishes": []},
+    "soup": {"synonyms": ["ash", "aash", "stew"], "dishes": []},
+    "cheese": {"synonyms": ["cheesy"], "dishes": []},
+    "egg": {"synonyms": ["eggs", "omelette", "omelet"], "dishes": []},
+    "vegetable": {"synonyms": ["vegetables", "veggie", "veggies", "greens"], "dishes": []},
+    "mushroom": {"synonyms": ["mushrooms"], "dishes": []},
+    "potato": {"synonyms": ["potatoes", "fries"], "dishes": []},
+    "bread": {"synonyms": ["toast"], "dishes": []},
+    "dessert": {"synonyms": ["sweets", "sweet", "cake", "pastry"], "dishes": ["ice cream", "cake", "cheesecake"]},
+    "ice cream": {"synonyms": ["gelato"], "dishes": []},
+    "drink": {"synonyms": ["drinks", "beverage", "juice", "soda"], "dishes": []},
+    "coffee": {"synonyms": ["espresso", "latte", "cappuccino"], "dishes": []},
+    "breakfast": {"synonyms": ["brunch"], "dishes": ["omelette", "pancake"]},
+    "spicy": {"synonyms": ["hot", "chili", "chilli", "pepper"], "dishes": []},
+    "fried": {"synonyms": ["crispy", "deep fried"], "dishes": []},
+    "grilled": {"synonyms": ["grill", "bbq", "barbecue"], "dishes": []},
+    "vegetarian": {"synonyms": ["vegan", "veg", "plant based"], "dishes": ["salad", "vegetable"]},
+}
+
+# Diet words that imply excluding other terms.
+IMPLIED_EXCLUDES = {
+    "vegetarian": ["meat", "seafood"],
+}
+
+# Excluding a broad term also excludes the narrower ones (menu names rarely say "meat").
+EXCLUDE_EXPANSIONS = {
+    "meat": ["beef", "lamb", "chicken", "steak", "kebab", "hot dog"],
+    "seafood": ["fish", "shrimp"],
+}
+
+NEGATIONS = [
+    "no", "not", "without", "except", "excluding", "avoid", "never", "nothing",
+    "don't want", "dont want", "do not want", "don't like", "dont like", "do not like",
+    "allergic to", "hate", "none", "non",
+]
+NEGATION_WINDOW = 4  # max words between a negation cue and the term it negates
+CLAUSE_BREAK = re.compile(r"[,.;!?]|\bbut\b")
+# Text between two terms that only joins them into a list ("beef, lamb", "beef or no lamb").
+LIST_CONNECTOR = re.compile(r"\s*(?:,\s*)?(?:(and|or|nor)\b\s*)?(?:(no|any)\s+)?")
+
+STOPWORDS = {
+    "a", "an", "the", "i", "me", "my", "we", "us", "you", "it", "is", "are", "am", "be", "to", "of", "in",
+    "on", "for", "with", "and", "or", "nor", "some", "something", "anything", "any", "want", "would", "like",
+    "love", "please", "can", "could", "give", "show", "find", "recommend", "suggest", "suggestion",
+    "food", "foods", "dish", "dishes", "meal", "meals", "eat", "eating", "have", "get", "today",
+    "tonight", "now", "lunch", "dinner", "maybe", "also", "really", "very", "good", "nice", "tasty",
+    "delicious", "kind", "type", "that", "this", "which", "what", "im", "i'm", "feel", "feeling", "mood",
+    "craving", "crave", "hungry", "free", "less", "much", "too", "more", "just", "only", "but",
+}
+
+# Below this share of understood content words, fall back to the LLM extractor.
+MIN_COVERAGE = 0.6
+
+_ALIASES = {}
+for _term, _entry in LEXICON.items():
+    _ALIASES[_term] = _term
+    for _syn in _entry["synonyms"]:
+        _ALIASES.setdefault(_syn, _term)
+
+_menu_terms = {}
+
+
+def menu_terms(db_path="food_orders.db"):
+    """Words from menu food names and categories; these count as understood keywords."""
+    if db_path not in _menu_terms:
+        terms = set()
+        try:
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT food_name, food_category FROM foods")
+            for food_name, category in cursor.fetchall():
+                for field in (food_name, category):
+                    terms.update(w for w in _words(field or "") if len(w) > 2 and w not in STOPWORDS)
+            conn.close()
+        except sqlite3.Error:
+            pass
+        _menu_terms[db_path] = terms
+    return _menu_terms[db_path]
+
+
+def _words(text):
+    return re.findall(r"[a-z]+(?:'[a-z]+)?", text.lower())
+
+
+def _phrase_pattern(phrases):
+    alternation = "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternation})\b")
+
+
+_ALIAS_PATTERN = _phrase_pattern(_ALIASES)
+_NEGATION_PATTERN = _phrase_pattern(NEGATIONS)
+
+
+def _connector(gap):
+    """"," / "and" / "or" when the text between two terms just joins them into a list, else None."""
+    m = LIST_CONNECTOR.fullmatch(gap)
+    if not m:
+        return None
+    word, cue = m.group(1), m.group(2)
+    if cue == "no":
+        # "no beef, no lamb": the item carries its own negation.
+        return "or"
+    if word is None:
+        return "," if "," in gap else None
+    return "or" if word == "nor" else word
+
+
+def _negated_spans(text, spans, negations):
+    """
+    Decide which term spans are negated. A cue negates the first term after it
+    (same clause, at most NEGATION_WINDOW words away) and the rest of a list
+    that starts there, if the list ends in "and"/"or" ("no chicken, beef or
+    lamb", "without cheese and mushrooms"). Any other term ends the scope, so
+    "no rice with chicken" and "not spicy chicken" only exclude rice / spicy.
+    Terms tacked on after a comma with no closing "and"/"or" ("no meat,
+    chicken") could go either way and are reported as ambiguous.
+    :param spans: (start, end) of every recognised term, in text order
+    :return: (negated spans, ambiguous spans)
+    """
+    negated, ambiguous = set(), set()
+    previous_end = None
+    i = 0
+    while i < len(spans):
+        start, end = spans[i]
+        cued = False
+        for neg_start, neg_end in negations:
+            if neg_end > start or (previous_end is not None and neg_start < previous_end):
+                continue
+            between = text[neg_end:start]
+            if not CLAUSE_BREAK.search(between) and len(_words(between)) <= NEGATION_WINDOW:
+                cued = True
+                break
+        if not cued:
+            previous_end = end
+            i += 1
+            continue
+
+        # Follow the list of terms joined to this one by commas / "and" / "or".
+        connectors = []
+        j = i
+        while j + 1 < len(spans):
+            connector = _connector(text[spans[j][1]:spans[j + 1][0]])
+            if connector is None:
+                break
+            connectors.append(connector)
+            j += 1
+        # The list is negated up to its last "and"/"or"; terms after a trailing comma are ambiguous.
+        last_joined = max((k + 1 for k, c in enumerate(connectors) if c != ","), default=0)
+        negated.update(spans[i:i + last_joined + 1])
+        ambiguous.update(spans[i + last_joined + 1:j + 1])
+        previous_end = spans[j][1]
+        i = j + 1
+    return negated, ambiguous
+
+
+def fast_extract_search_params(description, db_path="food_orders.db", widen_excludes=True):
+    """
+    Extract search parameters with the lexicon only.
+    :param description: User's food description
+    :param db_path: Menu database, used to recognise dish names
+    :param widen_excludes: Add implied/narrower exclusions ("vegetarian" -> meat, "no meat" -> beef ...);
+        turn off when exclusions become hard filters that should only drop what the user named
+    :return: (params, coverage) where coverage is the share of content words understood (0 if ambiguous)
+    """
+    text = " ".join(description.lower().split())
+    negations = [(m.start(), m.end()) for m in _NEGATION_PATTERN.finditer(text)]
+
+    terms = [(m.start(), m.end(), _ALIASES[m.group(0)]) for m in _ALIAS_PATTERN.finditer(text)]
+    covered = {w for start, end, _ in terms for w in _words(text[start:end])}
+
+    menu = menu_terms(db_path)
+    for m in re.finditer(r"[a-z]+(?:'[a-z]+)?", text):
+        word = m.group(0)
+        if word in menu and word not in covered and word not in _ALIASES:
+            terms.append((m.start(), m.end(), word))
+            covered.add(word)
+
+    terms.sort()
+    negated, ambiguous = _negated_spans(text, [(start, end) for start, end, _ in terms], negations)
+    include, exclude = [], []
+    for start, end, term in terms:
+        is_excluded = (start, end) in negated or re.match(r"[- ]free\b", text[end:])
+        target = exclude if is_excluded else include
+        if term not in target:
+            target.append(term)
+
+    # Implied and widened exclusions never override a term the user asked for
+    # ("no meat, chicken is fine" keeps chicken).
+    if widen_excludes:
+        for term in list(include):
+            exclude.extend(t for t in IMPLIED_EXCLUDES.get(term, []) if t not in exclude and t not in include)
+        for term in list(exclude):
+            exclude.extend(t for t in EXCLUDE_EXPANSIONS.get(term, []) if t not in exclude and t not in include)
+
+    guessed = []
+    for term in include:
+        for dish in LEXICON.get(term, {}).get("dishes", []):
+            if dish not in guessed and dish not in exclude:
+                guessed.append(dish)
+    include = [term for term in include if term not in exclude and term not in IMPLIED_EXCLUDES]
+
+    negation_words = {w for n in NEGATIONS for w in _words(n)}
+    content = [w for w in _words(text) if w not in STOPWORDS and w not in negation_words]
+    coverage = sum(1 for w in content if w in covered) / len(content) if content else 0.0
+    if ambiguous:
+        # Can't tell whether the user wants these or not: let the LLM extractor decide.
+        coverage = 0.0
+
+    params = {
+        "include_keywords": include,
+        "synonyms": {term: list(LEXICON[term]["synonyms"]) if term in LEXICON else [] for term in include},
+        "exclude_keywords": exclude,
+        "guessed_food_names": guessed,
+    }
+    return params, coverage
+
+
+_NUMBER = r"\$?\s*(\d[\d,]*(?:\.\d+)?)"
+_MAX_PRICE = re.compile(rf"\b(?:under|below|less than|cheaper than|at most|max(?:imum)?|up to)\s*{_NUMBER}")
+_MIN_PRICE = re.compile(rf"\b(?:over|above|more than|at least|min(?:imum)?)\s*{_NUMBER}")
+_PRICE_RANGE = re.compile(rf"\bbetween\s*{_NUMBER}\s*(?:and|to|-)\s*{_NUMBER}")
+
+
+def extract_price_range(description):
+    """
+    Find price limits like "under 200000", "more than 5" or "between 10 and 20".
+    :param description: User's food description
+    :return: (min_price, max_price), either may be None
+    """
+    text = description.lower()
+    number = lambda s: float(s.replace(",", ""))
+
+    m = _PRICE_RANGE.search(text)
+    if m:
+        low, high = sorted((number(m.group(1)), number(m.group(2))))
+        return low, high
+
+    m_min, m_max = _MIN_PRICE.search(text), _MAX_PRICE.search(text)
+    return (number(m_min.group(1)) if m_min else None), (number(m_max.group(1)) if m_max else None)
@@ -7,14 +7,22 @@ from typing import Optional
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, MessagesState
 from langgraph.prebuilt import tools_condition, ToolNode
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import HumanMessage, SystemMessage
 from dotenv import load_dotenv
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
-from db_manager import cancel_order, comment_order, check_order_status, food_search
+from db_manager import (
+    cancel_order,
+    cancel_orders,
+    comment_order,
+    check_order_status,
+    check_orders_status,
+    food_search,
+    FOOD_SEARCH_LIMIT,
+)
+from session_store import get_session_store
 
 
 llm = ChatOpenAI(
@@ -22,23 +30,27 @@ llm = ChatOpenAI(
     openai_api_key=OPENAI_API_KEY,
 )
 
-TOOLS = [cancel_order, check_order_status, comment_order, food_search]
+TOOLS = [cancel_order, cancel_orders, check_order_status, check_orders_status, comment_order, food_search]
 llm_with_tools = llm.bind_tools(TOOLS)
 
 ASSISTANT_PROMPT = (
-    """
+    f"""
 You are a helpful food ordering assistant for a CLI/terminal experience. You can NOT place orders yourself, but you help via these tools:
 
-1) food_search(food_name, restaurant_name)
+1) food_search(food_name, restaurant_name, cursor)
 2) cancel_order(order_id, phone_number)
 3) comment_order(order_id, person_name, comment)
 4) check_order_status(order_id)
+5) check_orders_status(order_ids)
+6) cancel_orders(order_ids, phone_number)
 
 Rules for multi-turn chat in terminal:
 - Use conversation memory (previous turns) to resolve short replies. If the user previously indicated an intent (e.g., "check status") and then provides just a number like "87", assume it's the missing order_id and proceed.
 - If information is still ambiguous, ask a concise follow-up question. DO NOT repeat questions already answered (e.g., if the user said "any restaurant", don't ask again).
+- When the user gives several order IDs at once, use check_orders_status / cancel_orders with the whole list in ONE call instead of calling the single-order tools repeatedly.
 - Never guess required fields; collect them. But do interpret terse follow-ups in context.
 - After each tool call, summarize the result briefly and clearly.
+- food_search returns at most {FOOD_SEARCH_LIMIT} matches; if next_cursor is set and the user asks for more, call it again with the same arguments and that cursor.
 - Only say: "Sorry, I can only help with food orders and related services." when the message is truly unrelated. Do NOT say this for numeric-only messages—those are likely IDs.
 """
 ).strip()
@@ -59,7 +71,8 @@ _builder.add_edge(START, "assistant")
 _builder.add_conditional_edges("assistant", tools_condition)
 _builder.add_edge("tools", "assistant")
 
-_memory = MemorySaver()
+# Conversation memory lives in the session store so any worker can continue a session.
+_memory = get_session_store().checkpointer()
 GRAPH = _builder.compile(checkpointer=_memory)
 
 
@@ -2,21 +2,40 @@
 # coding: utf-8
 
 import os
-import re
 import json
+import hashlib
 import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List
+from pydantic import BaseModel, Field
 from Levenshtein import distance
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import MessagesState, START, StateGraph
 from langgraph.prebuilt import tools_condition, ToolNode
 from langchain_core.messages import HumanMessage, SystemMessage
 from dotenv import load_dotenv
+from modules.single_flight import SingleFlight, normalize_key
+from modules.food_lexicon import fast_extract_search_params, extract_price_range, MIN_COVERAGE
+from modules.menu_index import semantic_food_search
+from session_store import get_session_store
+from db_manager import select_top_k, encode_cursor, cap_output
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# "keyword": extract keywords, then substring/edit-distance match (default)
+# "semantic": vector search over the menu index with the user's description as the query
+SEARCH_MODE = os.getenv("FOODCHAT_SUGGESTION_SEARCH", "keyword")
+SEMANTIC_TOP_K = 10
+
+# Tool output limits: foods per page and approximate tokens per tool result.
+SEARCH_PAGE_SIZE = 15
+MAX_OUTPUT_TOKENS = 600
+# Search params remembered for "show more" cursors.
+PAGE_PARAMS_CACHE_SIZE = 1024
+
 
 # Initialize LLM
 
@@ -39,41 +58,68 @@ Your task:
    - synonyms: synonyms for each keyword if possible
    - exclude_keywords: items the user explicitly says they don't want
    - guessed_food_names: possible actual food dish names that fit the description, even if the user didn't mention them directly
-"synonyms must always be a dictionary mapping each include_keyword to a list of synonyms, even if empty"
 
 From the user request: "{description}"
 
-Return JSON with keys: include_keywords, synonyms, exclude_keywords, guessed_food_names.
 Make sure guessed_food_names are in English.
 """
 )
 
+
+class KeywordSynonyms(BaseModel):
+    keyword: str = Field(description="an include keyword")
+    synonyms: List[str] = Field(default_factory=list, description="synonyms for the keyword, may be empty")
+
+
+class SearchParams(BaseModel):
+    include_keywords: List[str] = Field(default_factory=list)
+    synonyms: List[KeywordSynonyms] = Field(default_factory=list)
+    exclude_keywords: List[str] = Field(default_factory=list)
+    guessed_food_names: List[str] = Field(default_factory=list)
+
+
+structured_extractor = llm.with_structured_output(SearchParams)
+
+# How search parameters were obtained: lexicon only, LLM, or LLM failed (lexicon result used).
+extraction_stats = {"local": 0, "llm": 0, "llm_failed": 0}
+
+
 def extract_search_params(description):
-    prompt = extract_prompt.format(description=description)
-    response = llm.invoke(prompt)
-    response_text = getattr(response, "content", response)
-
-    # Clean up JSON
-    json_text_match = re.search(r"```json\s*(\{.*?\})\s*```", response_text, re.DOTALL)
-    if json_text_match:
-        json_text = json_text_match.group(1)
-    else:
-        json_text_match = re.search(r"(\{.*\})", response_text, re.DOTALL)
-        json_text = json_text_match.group(1) if json_text_match else response_text
+    params, coverage = fast_extract_search_params(description)
+    if coverage >= MIN_COVERAGE and (params["include_keywords"] or params["guessed_food_names"]):
+        extraction_stats["local"] += 1
+        return params
 
+    # Too little of the request is understood locally: ask the LLM.
     try:
-        params = json.loads(json_text)
-    except json.JSONDecodeError:
-        print("Failed to parse JSON:")
-        print(json_text)
-        params = {}
-
-    return params
+        result = structured_extractor.invoke(extract_prompt.format(description=description))
+    except Exception as e:
+        print(f"Failed to extract search parameters with the LLM: {e}")
+        extraction_stats["llm_failed"] += 1
+        return params
+
+    extraction_stats["llm"] += 1
+    llm_params = {
+        "include_keywords": result.include_keywords,
+        "synonyms": {item.keyword: item.synonyms for item in result.synonyms},
+        "exclude_keywords": list(result.exclude_keywords),
+        "guessed_food_names": result.guessed_food_names,
+    }
+    # Keep lexicon exclusions the LLM missed, unless they contradict what it says the user wants.
+    wanted = [kw.lower() for kw in llm_params["include_keywords"] + llm_params["guessed_food_names"]]
+    wanted += [syn.lower() for syns in llm_params["synonyms"].values() for syn in syns]
+    excluded = {kw.lower() for kw in llm_params["exclude_keywords"]}
+    for kw in params["exclude_keywords"]:
+        if kw in excluded or any(kw in w or w in kw for w in wanted):
+            continue
+        llm_params["exclude_keywords"].append(kw)
+    return llm_params
 
 
 # Food search function
 
-def enhanced_food_search(params, max_distance=2, db_path="food_orders.db"):
+def _scored_matches(params, max_distance, db_path):
+    """Yield ((edit_distance, id), food) for every menu row matching the search parameters."""
     if isinstance(params, str):
         params = json.loads(params)
 
@@ -87,14 +133,14 @@ def enhanced_food_search(params, max_distance=2, db_path="food_orders.db"):
     for syn_list in synonyms.values():
         all_keywords.update(syn_list)
     all_keywords.update(guessed_food_names)
+    if not all_keywords:
+        return
 
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    cursor.execute("SELECT food_name, food_category, restaurant_name, price FROM foods")
-    rows = cursor.fetchall()
+    cursor.execute("SELECT id, food_name, food_category, restaurant_name, price FROM foods")
 
-    results = []
-    for food_name_db, category_db, restaurant_db, price_db in rows:
+    for food_id, food_name_db, category_db, restaurant_db, price_db in cursor:
 
         # Exclude check
         if any(ex_kw.lower() in field.lower() for ex_kw in exclude_keywords
@@ -119,29 +165,108 @@ def enhanced_food_search(params, max_distance=2, db_path="food_orders.db"):
                 break
 
         if match_found:
-            results.append({
+            # Ties are broken by id so pages are stable between calls.
+            yield (min_dist, food_id), {
+                "id": food_id,
                 "food_name": food_name_db,
                 "category": category_db,
                 "restaurant_name": restaurant_db,
                 "price": price_db,
                 "edit_distance": min_dist
-            })
+            }
 
-    results.sort(key=lambda x: x["edit_distance"])
     conn.close()
-    return results
 
-def combined_food_search(user_input: str) -> str:
-    """Search for food items based on the user's natural language input."""
-    params = extract_search_params(user_input)
-    results = enhanced_food_search(params)
+
+def enhanced_food_search_page(params, limit=SEARCH_PAGE_SIZE, cursor=None, max_distance=2, db_path="food_orders.db"):
+    """
+    Top `limit` matches (heap selection, no full sort).
+    :return: (foods, next_cursor); pass next_cursor back in to get the following page
+    """
+    return select_top_k(_scored_matches(params, max_distance, db_path), limit, cursor)
+
+
+# Cursors start with a key for the search params of the first page, so later pages
+# continue the same result set instead of re-extracting (possibly different) params.
+_page_params = OrderedDict()
+_page_params_lock = threading.Lock()
+
+
+def _params_key(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _remember_params(params):
+    key = _params_key(params)
+    with _page_params_lock:
+        _page_params[key] = params
+        _page_params.move_to_end(key)
+        while len(_page_params) > PAGE_PARAMS_CACHE_SIZE:
+            _page_params.popitem(last=False)
+    return key
+
+
+def _recall_params(key):
+    with _page_params_lock:
+        return _page_params.get(key)
+
+
+# Identical searches running at the same time (e.g. during promotions) share one LLM call + DB scan.
+search_flight = SingleFlight("food_suggestion.combined_food_search")
+
+
+def combined_food_search(user_input: str, cursor: str = "") -> str:
+    """Search for food items based on the user's natural language input.
+
+    Results are paged; to show more, call again with the same input and the cursor from the previous result.
+    """
+    return search_flight.do(normalize_key(user_input) + "|" + (cursor or ""), _combined_food_search, user_input, cursor)
+
+
+def _combined_food_search(user_input: str, cursor: str = "") -> str:
+    next_cursor = None
+    notes = []
+    if SEARCH_MODE == "semantic":
+        # Exclusions are hard prefilters here: only drop what the user named, the
+        # vector query already ranks by the rest of the description.
+        params, _ = fast_extract_search_params(user_input, widen_excludes=False)
+        min_price, max_price = extract_price_range(user_input)
+        results = semantic_food_search(
+            user_input,
+            k=SEMANTIC_TOP_K,
+            min_price=min_price,
+            max_price=max_price,
+            exclude_keywords=params["exclude_keywords"],
+        )
+        if cursor:
+            notes.append(f"(Semantic search only returns the top {SEMANTIC_TOP_K} matches; there are no more pages.)")
+    else:
+        params_key, _, after = (cursor or "").partition(":")
+        params = _recall_params(params_key) if cursor else None
+        if params is None:
+            params = extract_search_params(user_input)
+            if cursor and _params_key(params) != params_key:
+                # Params behind the cursor are gone (another worker or evicted) and came out different.
+                after = None
+                notes.append("(The search was re-run, so these results start again from the top.)")
+        params_key = _remember_params(params)
+        results, next_cursor = enhanced_food_search_page(params, cursor=after)
     if not results:
-        return "No food items matching your criteria were found."
+        return "\n".join(notes + ["No food items matching your criteria were found."])
 
     output_lines = [
         f"{r['food_name']} ({r['category']}) - {r['restaurant_name']} - {r['price']} "
         for r in results
     ]
+
+    # Keep the tool output (and so the prompt) small however big the menu is.
+    shown = cap_output(output_lines, MAX_OUTPUT_TOKENS)
+    if shown < len(output_lines) and "id" in results[shown - 1]:
+        last = results[shown - 1]
+        next_cursor = encode_cursor((last["edit_distance"], last["id"]))
+    output_lines = notes + output_lines[:shown]
+    if next_cursor:
+        output_lines.append(f"(More results available: call again with cursor='{params_key}:{next_cursor}')")
     return "\n".join(output_lines)
 
 # Bind the tool
@@ -158,6 +283,7 @@ When the user message contains any request about food, cuisine, dishes, ingredie
 If the user message is unrelated to food or food search, respond politely that you can only assist with food search.  
 
 When the tool returns a result, summarize it in natural language. If the result is empty, inform the user politely.
+If the result says more results are available and the user asks for more, call the tool again with the same input and that cursor.
 
 note that you can not order foods directly, you are assistant.
 If the user asks about anything else not related to food orders, searching, or comments, respond with:  
@@ -179,7 +305,7 @@ builder.add_edge(START, "assistant")
 builder.add_conditional_edges("assistant", tools_condition)
 builder.add_edge("tools", "assistant")
 
-memory = MemorySaver()
+memory = get_session_store().checkpointer()
 graph = builder.compile(checkpointer=memory)
 
 
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Semantic search over the restaurant menu (the `foods` table).
+
+Each menu row is embedded as "food name (category) - restaurant" with the same
+bge-small model food_info uses and stored in a LanceDB table next to the
+knowledge base. The index is kept in sync incrementally: rows are hashed and
+only new or changed rows are re-embedded, removed rows are deleted.
+
+semantic_food_search() takes the user's description as-is and returns the
+top-k dishes, with price limits and excluded keywords applied inside the
+vector query. Queries never wait for a sync: once the index exists, it is
+refreshed in a background thread.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+
+import lancedb
+
+MENU_TABLE_NAME = "menu_index"
+
+# Re-check the foods table for changes at most this often (seconds).
+MENU_SYNC_INTERVAL = 60
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_state = {"table": None, "synced_at": 0.0, "refreshing": False}
+
+
+def _embedding():
+    # Same model instance as food_info: each process loads it only once.
+    from modules.food_info import get_embedding
+
+    return get_embedding()
+
+
+def _row_text(food_name, category, restaurant_name):
+    return f"{food_name} ({category}) - {restaurant_name}"
+
+
+def _row_hash(food_name, category, restaurant_name, price):
+    return hashlib.sha1(f"{food_name}|{category}|{restaurant_name}|{price}".encode()).hexdigest()
+
+
+def _sql_quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _like_contains(value):
+    """LIKE pattern for `value` anywhere in the text; %, _ and backslash in it match literally."""
+    escaped = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return _sql_quote("%" + escaped + "%")
+
+
+def sync_menu_index(db_path="food_orders.db", force=False):
+    """
+    Bring the LanceDB menu index up to date with the foods table.
+    :param db_path: Menu database
+    :param force: Sync even if the last sync was less than MENU_SYNC_INTERVAL seconds ago
+    :return: Number of rows (re-)embedded or deleted
+    """
+    with _lock:
+        if not force and _state["table"] is not None and time.time() - _state["synced_at"] < MENU_SYNC_INTERVAL:
+            return 0
+
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, food_name, food_category, restaurant_name, price FROM foods")
+        rows = {row[0]: row[1:] for row in cursor.fetchall()}
+        conn.close()
+
+        from modules.food_info import LANCEDB_PATH
+
+        db = lancedb.connect(LANCEDB_PATH)
+        table = _state["table"]
+        if table is None and MENU_TABLE_NAME in db.table_names():
+            table = db.open_table(MENU_TABLE_NAME)
+
+        indexed = {}
+        if table is not None:
+            indexed = {r["id"]: r["row_hash"] for r in table.to_arrow().select(["id", "row_hash"]).to_pylist()}
+
+        changed = [food_id for food_id, row in rows.items() if indexed.get(food_id) != _row_hash(*row)]
+        removed = [food_id for food_id in indexed if food_id not in rows]
+
+        stale = [food_id for food_id in changed if food_id in indexed] + removed
+        if table is not None and stale:
+            table.delete(f"id IN ({','.join(str(int(i)) for i in stale)})")
+
+        if changed:
+            texts = [_row_text(*rows[food_id][:3]) for food_id in changed]
+            vectors = _embedding().embed_documents(texts)
+            data = [
+                {
+                    "id": food_id,
+                    "food_name": rows[food_id][0],
+                    "category": rows[food_id][1],
+                    "restaurant_name": rows[food_id][2],
+                    "price": float(rows[food_id][3] or 0),
+                    "text": text,
+                    "search_text": text.lower(),
+                    "row_hash": _row_hash(*rows[food_id]),
+                    "vector": vector,
+                }
+                for food_id, text, vector in zip(changed, texts, vectors)
+            ]
+            if table is None:
+                table = db.create_table(MENU_TABLE_NAME, data=data)
+            else:
+                table.add(data)
+
+        _state["table"] = table
+        _state["synced_at"] = time.time()
+        return len(changed) + len(removed)
+
+
+def refresh_menu_index(db_path="food_orders.db"):
+    """Start a background sync if one is due and none is running; never blocks the caller."""
+    with _refresh_lock:
+        if _state["refreshing"] or time.time() - _state["synced_at"] < MENU_SYNC_INTERVAL:
+            return
+        _state["refreshing"] = True
+
+    def run():
+        try:
+            sync_menu_index(db_path)
+        except Exception as e:
+            print(f"Menu index sync failed: {e}")
+            _state["synced_at"] = time.time()  # try again after the next interval
+        finally:
+            with _refresh_lock:
+                _state["refreshing"] = False
+
+    threading.Thread(target=run, name="menu-index-sync", daemon=True).start()
+
+
+def semantic_food_search(description, k=10, min_price=None, max_price=None, exclude_keywords=None,
+                         db_path="food_orders.db"):
+    """
+    Find the dishes closest in meaning to the user's description.
+    :param description: User's food description, used as the query as-is
+    :param k: Number of dishes to return
+    :param min_price: Minimum price (optional)
+    :param max_price: Maximum price (optional)
+    :param exclude_keywords: Dishes whose name/category/restaurant contain any of these are skipped
+    :param db_path: Menu database
+    :return: List of matching foods, best first
+    """
+    table = _state["table"]
+    if table is None:
+        # First query in this process (normally done by the warm-up): open or build the index.
+        sync_menu_index(db_path)
+        table = _state["table"]
+        if table is None:
+            return []
+    else:
+        refresh_menu_index(db_path)
+
+    filters = []
+    if min_price is not None:
+        filters.append(f"price >= {float(min_price)}")
+    if max_price is not None:
+        filters.append(f"price <= {float(max_price)}")
+    for kw in exclude_keywords or []:
+        filters.append(f"search_text NOT LIKE {_like_contains(kw.lower())}")
+
+    query = table.search(_embedding().embed_query(description)).limit(k)
+    if filters:
+        query = query.where(" AND ".join(filters), prefilter=True)
+
+    return [
+        {
+            "food_name": r["food_name"],
+            "category": r["category"],
+            "restaurant_name": r["restaurant_name"],
+            "price": r["price"],
+            "distance": r["_distance"],
+        }
+        for r in query.to_list()
+    ]
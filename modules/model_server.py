@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Optional model server (sidecar) for the food_info module.
+
+Every Chainlit worker that builds a FoodInfoModule would otherwise load its own
+bge-small embedding model and LanceDB handles. Run one server per host instead:
+
+    python -m modules.model_server
+
+and set FOODCHAT_MODEL_SERVER to the same socket path, and FOODCHAT_MODEL_SERVER_AUTHKEY
+to the same secret, in the server's and the workers' environment.
+Workers then embed and search through a thin client; concurrent embed requests
+are batched on the server into a single model call. When the server is not
+running, FoodInfoModule falls back to loading everything in-process; when it goes away
+later, the clients reconnect once it is back and use in-process models meanwhile.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.managers import BaseManager
+from typing import Any, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL_SERVER_ADDRESS = os.getenv("FOODCHAT_MODEL_SERVER", "")
+# Shared secret for the manager connection, which exchanges pickled data. No default on purpose:
+# a well-known key would let any local user talk to the server.
+MODEL_SERVER_AUTHKEY = os.getenv("FOODCHAT_MODEL_SERVER_AUTHKEY", "").encode()
+
+# Server-side batching: wait at most BATCH_WAIT seconds to fill up to BATCH_SIZE texts.
+BATCH_SIZE = 32
+BATCH_WAIT = 0.005
+
+# After the server could not be reached, wait this long before trying to reconnect.
+RECONNECT_SECONDS = 30
+
+# Errors from a proxy call that mean the server went away (crash, restart, changed auth key).
+SERVER_ERRORS = (OSError, EOFError, AuthenticationError)
+
+
+class BatchingEmbeddings(Embeddings):
+    """Wraps an embedding model so concurrent callers share one embed_documents call."""
+
+    def __init__(self, embedding, batch_size=BATCH_SIZE, batch_wait=BATCH_WAIT):
+        self.embedding = embedding
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue = queue.Queue()
+        self.requests = 0
+        self.batches = 0
+        self.thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self.thread.start()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        future = Future()
+        self.queue.put((list(texts), future))
+        return future.result()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.batch_wait
+            while size < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = self.embedding.embed_documents(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.requests += len(batch)
+            self.batches += 1
+            start = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[start:start + len(item_texts)])
+                start += len(item_texts)
+
+
+class ModelService:
+    """Heavy food_info state (embedding model + LanceDB knowledge base) served to workers."""
+
+    def __init__(self):
+        from langchain_huggingface import HuggingFaceEmbeddings
+        from langchain_community.vectorstores import LanceDB
+        from modules.food_info import EMBEDDING_MODEL, open_knowledge_table
+
+        self.embedding = BatchingEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL))
+        self.db, self.table = open_knowledge_table(self.embedding)
+        self.vectorstore = LanceDB(connection=self.db, table=self.table, embedding=self.embedding)
+
+    def embed(self, texts):
+        return self.embedding.embed_documents(texts)
+
+    def search(self, query, k=5):
+        return [doc.page_content for doc in self.vectorstore.similarity_search(query, k=k)]
+
+    def stats(self):
+        return {"requests": self.embedding.requests, "batches": self.embedding.batches}
+
+
+class ModelServerManager(BaseManager):
+    pass
+
+
+class ModelClientManager(BaseManager):
+    pass
+
+
+ModelClientManager.register("service")
+
+
+class ModelServerUnavailable(Exception):
+    pass
+
+
+class ServerConnection:
+    """Service proxy shared by a worker's clients; reconnects when the server was restarted."""
+
+    def __init__(self, service, address=None):
+        self.service = service
+        self.address = address
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+
+    def _current(self):
+        with self.lock:
+            if self.service is None and time.monotonic() >= self.retry_at:
+                self.service = connect_model_server(self.address)
+                if self.service is None:
+                    self.retry_at = time.monotonic() + RECONNECT_SECONDS
+            return self.service
+
+    def _drop(self, service, retry_in):
+        with self.lock:
+            if self.service is service:
+                self.service = None
+                self.retry_at = time.monotonic() + retry_in
+
+    def call(self, method, *args):
+        """
+        Call `method` on the server, reconnecting once if the connection broke.
+        :raise ModelServerUnavailable: when the server can't be reached
+        """
+        for retry_in in (0, RECONNECT_SECONDS):
+            service = self._current()
+            if service is None:
+                break
+            try:
+                return getattr(service, method)(*args)
+            except SERVER_ERRORS:
+                # Proxies share one cached connection per thread and address; drop this thread's
+                # broken one so a proxy from the reconnect opens a new connection.
+                service._tls.__dict__.pop("connection", None)
+                self._drop(service, retry_in)
+        raise ModelServerUnavailable(f"Model server {self.address or MODEL_SERVER_ADDRESS} is not reachable")
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Embeddings client backed by the model server.
+    :param connection: ServerConnection to the model server
+    :param fallback: Returns the in-process Embeddings to use while the server is unreachable
+    """
+
+    def __init__(self, connection, fallback=None):
+        self.connection = connection
+        self.fallback = fallback
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        try:
+            return self.connection.call("embed", list(texts))
+        except ModelServerUnavailable:
+            if self.fallback is None:
+                raise
+            return self.fallback().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class RemoteRetriever(BaseRetriever):
+    """Retriever client backed by the model server's LanceDB search; `fallback` returns an in-process retriever."""
+
+    connection: Any
+    k: int = 5
+    fallback: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        try:
+            texts = self.connection.call("search", query, self.k)
+        except ModelServerUnavailable:
+            if self.fallback is None:
+                raise
+            return self.fallback().invoke(query)
+        return [Document(page_content=text) for text in texts]
+
+
+def connect_model_server(address=None):
+    """
+    Connect to a running model server.
+    :param address: Unix socket path (defaults to FOODCHAT_MODEL_SERVER)
+    :return: Service proxy, or None when no server is configured or reachable
+    """
+    address = address or MODEL_SERVER_ADDRESS
+    if not address or not os.path.exists(address):
+        return None
+    if not MODEL_SERVER_AUTHKEY:
+        print("FOODCHAT_MODEL_SERVER is set but FOODCHAT_MODEL_SERVER_AUTHKEY is not; loading models in-process.")
+        return None
+
+    manager = ModelClientManager(address=address, authkey=MODEL_SERVER_AUTHKEY)
+    try:
+        manager.connect()
+    except (OSError, EOFError, AuthenticationError):
+        return None
+    try:
+        return manager.service()
+    except SERVER_ERRORS:
+        return None
+
+
+def serve(address=None):
+    if not MODEL_SERVER_AUTHKEY:
+        raise SystemExit("Set FOODCHAT_MODEL_SERVER_AUTHKEY to a secret shared with the workers.")
+    address = address or MODEL_SERVER_ADDRESS or "/tmp/foodchat-model.sock"
+    if os.path.exists(address):
+        os.remove(address)
+
+    service = ModelService()
+    ModelServerManager.register("service", callable=lambda: service)
+    manager = ModelServerManager(address=address, authkey=MODEL_SERVER_AUTHKEY)
+    # Create the socket owner-only (0600) from the start, not chmod-ed after a window.
+    old_umask = os.umask(0o177)
+    try:
+        server = manager.get_server()
+    finally:
+        os.umask(old_umask)
+    os.chmod(address, 0o600)
+    print(f"Model server listening on {address}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Single-flight request coalescing.
+
+When several sessions ask the same thing at the same time, only the first
+caller runs the expensive pipeline; the others wait for and share its result.
+Works for plain threads (sync callers) and asyncio callers alike, and both
+kinds can join the same in-flight computation.
+"""
+
+import asyncio
+import re
+import threading
+from concurrent.futures import Future
+
+
+def normalize_key(text: str) -> str:
+    """Case-, whitespace- and trailing-punctuation-insensitive key for a user request."""
+    return re.sub(r"\s+", " ", str(text)).strip().strip("?!.").strip().lower()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.tasks = set()
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+        _flights[name] = self
+
+    def _join(self, key):
+        with self.lock:
+            self.calls += 1
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            # Running futures can't be cancelled: one waiter giving up must not cancel the call for the rest.
+            future.set_running_or_notify_cancel()
+            self.in_flight[key] = future
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self.lock:
+            self.in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _run(self, key, future, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+        else:
+            self._finish(key, future, result)
+
+    async def _run_async(self, key, future, fn, args, kwargs):
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+        else:
+            self._finish(key, future, result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) unless an identical call (same key) is already running; share its result."""
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, fn, args, kwargs)
+        return future.result()
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """Async version of do(); fn may be a coroutine function or a blocking function (run in a thread)."""
+        future, leader = self._join(key)
+        if leader:
+            loop = asyncio.get_running_loop()
+            if asyncio.iscoroutinefunction(fn):
+                # Own task, so cancelling the leader's caller doesn't cancel the shared call.
+                task = loop.create_task(self._run_async(key, future, fn, args, kwargs))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+            else:
+                loop.run_in_executor(None, self._run, key, future, fn, args, kwargs)
+        # A cancelled caller stops waiting; the shared future (and everyone else) is unaffected.
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self.in_flight),
+            }
+
+
+_flights = {}
+
+
+def single_flight_stats():
+    """Counters for every SingleFlight in the process, keyed by name."""
+    return {name: flight.snapshot() for name, flight in _flights.items()}
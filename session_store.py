@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import sqlite3
+import importlib
+import threading
+from abc import ABC, abstractmethod
+
+from langgraph.checkpoint.memory import MemorySaver
+
+
+# How long a turn may hold a session before another node may take it over.
+LEASE_SECONDS = 120
+
+
+class VersionConflict(Exception):
+    """Another node saved the session since we loaded it."""
+
+
+class SessionBusy(Exception):
+    """Another node is still handling a turn of this session."""
+
+
+class SessionStore(ABC):
+    """
+    Per-session chat state (sticky module, graph thread IDs) plus the LangGraph
+    checkpointer holding conversation memory. Every saved state carries a version;
+    save() only succeeds if the version is unchanged since load() (optimistic
+    concurrency), so two nodes handling the same session never overwrite each other.
+    """
+
+    @abstractmethod
+    def load(self, session_id):
+        """
+        :param session_id: Chat session ID
+        :return: (state dict, version); ({}, 0) for a new session
+        """
+
+    @abstractmethod
+    def save(self, session_id, state, expected_version):
+        """
+        :param session_id: Chat session ID
+        :param state: JSON-serializable state dict
+        :param expected_version: Version returned by load()
+        :return: The new version
+        :raises VersionConflict: if the session was saved by someone else in between
+        """
+
+    @abstractmethod
+    def checkpointer(self):
+        """LangGraph checkpointer that stores graph memory where every node can reach it."""
+
+    def update(self, session_id, fn, retries=5):
+        """
+        Apply fn(state) -> new state with load/save, retrying on VersionConflict.
+        :return: The saved state
+        """
+        for _ in range(retries):
+            state, version = self.load(session_id)
+            new_state = fn(dict(state))
+            try:
+                self.save(session_id, new_state, version)
+                return new_state
+            except VersionConflict:
+                continue
+        raise VersionConflict(f"Session {session_id} kept changing; gave up after {retries} attempts.")
+
+    def acquire(self, session_id, owner, ttl=LEASE_SECONDS, retries=5):
+        """
+        Take the session's turn lease, so only one node routes and runs a turn at a time.
+        :param owner: Unique ID of this turn
+        :param ttl: Seconds after which the lease may be taken over (the holder is assumed dead)
+        :return: (state without the lease, version that holds the lease); pass both to release()
+        :raises SessionBusy: if another turn holds an unexpired lease
+        """
+        for _ in range(retries):
+            state, version = self.load(session_id)
+            lease = state.pop("lease", None)
+            if lease and lease["owner"] != owner and lease["expires"] > time.time():
+                raise SessionBusy(session_id)
+            try:
+                version = self.save(session_id, {**state, "lease": {"owner": owner, "expires": time.time() + ttl}},
+                                    version)
+                return state, version
+            except VersionConflict:
+                continue
+        raise SessionBusy(session_id)
+
+    def release(self, session_id, state, version):
+        """
+        Save the turn's final state and drop the lease.
+        :raises VersionConflict: if the lease expired and another node took the session over meanwhile
+        """
+        state = {k: v for k, v in state.items() if k != "lease"}
+        return self.save(session_id, state, version)
+
+
+class InMemorySessionStore(SessionStore):
+    """Single-process store (the previous behavior): sessions are pinned to one worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.saver = MemorySaver()
+
+    def load(self, session_id):
+        with self.lock:
+            state, version = self.sessions.get(session_id, ({}, 0))
+            return dict(state), version
+
+    def save(self, session_id, state, expected_version):
+        with self.lock:
+            _, version = self.sessions.get(session_id, ({}, 0))
+            if version != expected_version:
+                raise VersionConflict(session_id)
+            self.sessions[session_id] = (dict(state), version + 1)
+            return version + 1
+
+    def checkpointer(self):
+        return self.saver
+
+
+class SQLiteSessionStore(SessionStore):
+    """File-backed store shared by all worker processes on one host."""
+
+    def __init__(self, db_path="sessions.db"):
+        self.db_path = db_path
+        self.saver = None
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        connection.commit()
+        connection.close()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=5)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def load(self, session_id):
+        connection = self._connect()
+        cursor = connection.cursor()
+        cursor.execute("SELECT state, version FROM chat_sessions WHERE session_id = ?", (session_id,))
+        result = cursor.fetchone()
+        connection.close()
+        if result is None:
+            return {}, 0
+        return json.loads(result[0]), result[1]
+
+    def save(self, session_id, state, expected_version):
+        connection = self._connect()
+        cursor = connection.cursor()
+        if expected_version == 0:
+            cursor.execute(
+                "INSERT INTO chat_sessions (session_id, state, version, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(session_id) DO NOTHING",
+                (session_id, json.dumps(state), time.time()),
+            )
+        else:
+            cursor.execute(
+                "UPDATE chat_sessions SET state = ?, version = version + 1, updated_at = ? "
+                "WHERE session_id = ? AND version = ?",
+                (json.dumps(state), time.time(), session_id, expected_version),
+            )
+        saved = cursor.rowcount == 1
+        connection.commit()
+        connection.close()
+        if not saved:
+            raise VersionConflict(session_id)
+        return expected_version + 1
+
+    def checkpointer(self):
+        if self.saver is None:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+
+            self.saver = SqliteSaver(sqlite3.connect(self.db_path, check_same_thread=False))
+        return self.saver
+
+
+class KeyValueClient(ABC):
+    """Minimal interface a networked KV store (Redis, etcd, DynamoDB ...) must provide."""
+
+    @abstractmethod
+    def get(self, key):
+        """:return: The stored string, or None"""
+
+    @abstractmethod
+    def compare_and_set(self, key, expected, value):
+        """
+        Atomically set key to value if its current value equals expected (None = key absent).
+        :return: True if the value was set
+        """
+
+
+class KeyValueSessionStore(SessionStore):
+    """
+    Store for multi-host deployments on top of any KeyValueClient. Conversation memory
+    needs a checkpointer backed by a shared database as well (e.g. LangGraph's Postgres
+    or Redis savers), passed in as `checkpointer`.
+    """
+
+    def __init__(self, client, checkpointer, prefix="foodchat:session:"):
+        self.client = client
+        self.saver = checkpointer
+        self.prefix = prefix
+
+    def load(self, session_id):
+        raw = self.client.get(self.prefix + session_id)
+        if raw is None:
+            return {}, 0
+        record = json.loads(raw)
+        return record["state"], record["version"]
+
+    def save(self, session_id, state, expected_version):
+        key = self.prefix + session_id
+        current = self.client.get(key)
+        version = json.loads(current)["version"] if current is not None else 0
+        if version != expected_version:
+            raise VersionConflict(session_id)
+        record = json.dumps({"state": state, "version": version + 1})
+        if not self.client.compare_and_set(key, current, record):
+            raise VersionConflict(session_id)
+        return version + 1
+
+    def checkpointer(self):
+        return self.saver
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """
+    Process-wide session store chosen by FOODCHAT_SESSION_STORE:
+      "memory" (default)            - in-process, sessions pinned to one worker
+      "sqlite:<path>"               - shared by all workers on this host
+      "factory:<module>:<function>" - function() returns the store, e.g. a KeyValueSessionStore
+                                      for multi-host deployments
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            spec = os.getenv("FOODCHAT_SESSION_STORE", "memory")
+            if spec.startswith("sqlite"):
+                _, _, path = spec.partition(":")
+                _store = SQLiteSessionStore(path or "sessions.db")
+            elif spec.startswith("factory:"):
+                module_name, _, function = spec[len("factory:"):].partition(":")
+                _store = getattr(importlib.import_module(module_name), function)()
+            else:
+                _store = InMemorySessionStore()
+        return _store
+
+
+def set_session_store(store):
+    """
+    Use a custom store; must be called before the chat graphs are imported (i.e. before main).
+    Deployments started through chat_ui should use FOODCHAT_SESSION_STORE=factory:... instead.
+    """
+    global _store
+    with _store_lock:
+        _store = store
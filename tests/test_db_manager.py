@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("Levenshtein")
+
+from db_manager import _order_id_list, decode_cursor, encode_cursor, select_top_k
+
+
+def test_order_id_list_parses_free_text():
+    assert _order_id_list("87, 88 and 91") == [87, 88, 91]
+
+
+def test_order_id_list_drops_duplicates_and_keeps_order():
+    assert _order_id_list([91, "87", 91]) == [91, 87]
+    assert _order_id_list(12) == [12]
+
+
+def test_decode_cursor_rejects_well_formed_garbage():
+    for cursor in ['["a",1]', "[1]", '{"a":1}', "[true,2]", "not json", ""]:
+        assert decode_cursor(cursor) is None
+    assert decode_cursor(encode_cursor((1, 42))) == (1, 42)
+
+
+def test_select_top_k_pages_with_cursor():
+    scored = [((d, i), i) for i, d in enumerate([2, 0, 1, 0, 2])]
+    page, cursor = select_top_k(scored, 3)
+    assert page == [1, 3, 2]
+    page, cursor = select_top_k(scored, 3, cursor)
+    assert page == [0, 4] and cursor is None
+    assert select_top_k(scored, 3, '["a",1]')[0] == [1, 3, 2]
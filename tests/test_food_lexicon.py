@@ -0,0 +1,73 @@
+import pytest
+
+from modules.food_lexicon import MIN_COVERAGE, extract_price_range, fast_extract_search_params
+
+
+@pytest.fixture
+def extract(tmp_path):
+    db_path = str(tmp_path / "empty.db")  # no menu: only the lexicon is used
+
+    def run(description, **kwargs):
+        params, coverage = fast_extract_search_params(description, db_path=db_path, **kwargs)
+        return params["include_keywords"], params["exclude_keywords"], coverage
+
+    return run
+
+
+@pytest.mark.parametrize("description, excluded", [
+    ("no chicken, beef or lamb", ["chicken", "beef", "lamb"]),
+    ("no chicken, beef, or lamb", ["chicken", "beef", "lamb"]),
+    ("pasta without cheese and mushrooms", ["cheese", "mushroom"]),
+    ("i hate chicken, beef and fish", ["chicken", "beef", "fish"]),
+    ("no fish, shrimp or seafood", ["fish", "shrimp", "seafood"]),
+    ("without meat or fish", ["meat", "fish"]),
+    ("no chicken nor beef", ["chicken", "beef"]),
+    ("i don't want any fish or shrimp please", ["fish", "shrimp"]),
+    ("no beef, no lamb, just chicken", ["beef", "lamb"]),
+])
+def test_negated_lists_are_excluded(extract, description, excluded):
+    include, exclude, coverage = extract(description, widen_excludes=False)
+    assert sorted(exclude) == sorted(excluded)
+    assert not set(include) & set(excluded)
+    assert coverage >= MIN_COVERAGE
+
+
+@pytest.mark.parametrize("description, included, excluded", [
+    ("no rice with chicken kebab", ["chicken", "kebab"], ["rice"]),
+    ("not spicy chicken sandwich", ["chicken", "sandwich"], ["spicy"]),
+    ("non spicy chicken soup", ["chicken", "soup"], ["spicy"]),
+    ("spicy chicken without rice", ["spicy", "chicken"], ["rice"]),
+    ("no chicken or beef kebab", ["kebab"], ["chicken", "beef"]),
+    ("gluten-free pasta no mushrooms", ["pasta"], ["mushroom"]),
+])
+def test_negation_stops_at_the_next_unjoined_term(extract, description, included, excluded):
+    include, exclude, _ = extract(description, widen_excludes=False)
+    assert include == included
+    assert exclude == excluded
+
+
+@pytest.mark.parametrize("description", ["no meat, chicken is fine", "no beef, lamb"])
+def test_comma_without_closing_conjunction_is_ambiguous(extract, description):
+    include, exclude, coverage = extract(description)
+    # Not excluded locally, and low coverage sends the request to the LLM extractor.
+    assert coverage < MIN_COVERAGE
+    assert include and not set(include) & set(exclude)
+
+
+def test_widened_exclusions_keep_requested_terms(extract):
+    include, exclude, _ = extract("vegetarian pizza")
+    assert include == ["pizza"]
+    assert {"meat", "chicken", "fish"} <= set(exclude)
+
+    include, exclude, _ = extract("no meat, chicken is fine")
+    assert "chicken" in include and "chicken" not in exclude
+
+
+@pytest.mark.parametrize("description, expected", [
+    ("pizza under 200,000", (None, 200000.0)),
+    ("something more than 5", (5.0, None)),
+    ("between 20 and 10", (10.0, 20.0)),
+    ("just pizza", (None, None)),
+])
+def test_extract_price_range(description, expected):
+    assert extract_price_range(description) == expected
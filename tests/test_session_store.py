@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from session_store import InMemorySessionStore, SQLiteSessionStore, SessionBusy, VersionConflict
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"))
+
+
+def test_save_detects_concurrent_change(store):
+    state, version = store.load("s")
+    store.save("s", {"n": 1}, version)
+    with pytest.raises(VersionConflict):
+        store.save("s", {"n": 2}, version)
+
+
+def test_update_retries_until_every_increment_lands(store):
+    def work():
+        for _ in range(20):
+            store.update("s", lambda state: {**state, "n": state.get("n", 0) + 1}, retries=100)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.load("s")[0]["n"] == 80
+
+
+def test_lease_blocks_a_second_turn_until_released(store):
+    state, version = store.acquire("s", "turn-1")
+    with pytest.raises(SessionBusy):
+        store.acquire("s", "turn-2")
+
+    store.release("s", {**state, "current_module": "food_services"}, version)
+    state, version = store.acquire("s", "turn-2")
+    assert state == {"current_module": "food_services"}
+
+
+def test_expired_lease_is_taken_over_and_late_release_conflicts(store):
+    _, stale_version = store.acquire("s", "turn-1", ttl=0)
+    state, version = store.acquire("s", "turn-2")
+    with pytest.raises(VersionConflict):
+        store.release("s", {"current_module": "food_info"}, stale_version)
+    store.release("s", state, version)
+    assert "lease" not in store.load("s")[0]
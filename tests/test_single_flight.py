@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+from modules.single_flight import SingleFlight, normalize_key
+
+
+def test_normalize_key():
+    assert normalize_key("  Is Garlic   good?? ") == normalize_key("is garlic good")
+
+
+def test_concurrent_sync_calls_share_one_run():
+    flight = SingleFlight("test.sync")
+    runs = []
+
+    def slow(x):
+        runs.append(x)
+        time.sleep(0.2)
+        return x * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow, 21))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [42] * 5
+    assert len(runs) == 1
+
+
+def _cancel_one_waiter(fn):
+    flight = SingleFlight("test.cancel")
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do_async("k", fn))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(flight.do_async("k", fn)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        followers[0].cancel()
+        return await asyncio.gather(leader, *followers, return_exceptions=True)
+
+    return flight, asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_others_blocking_fn():
+    def blocking():
+        time.sleep(0.1)
+        return "answer"
+
+    flight, (leader, cancelled, other) = _cancel_one_waiter(blocking)
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert leader == other == "answer"
+    assert flight.snapshot()["executed"] == 1
+
+
+def test_cancelled_waiter_does_not_cancel_others_coroutine_fn():
+    async def coroutine():
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    _, (leader, cancelled, other) = _cancel_one_waiter(coroutine)
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert leader == other == "answer"
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight("test.cancel_leader")
+
+    async def coroutine():
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do_async("k", coroutine))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.do_async("k", coroutine))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader, follower = asyncio.run(scenario())
+    assert isinstance(leader, asyncio.CancelledError)
+    assert follower == "answer"
+
+
+def test_errors_are_shared_and_key_is_released():
+    flight = SingleFlight("test.error")
+
+    def boom():
+        raise ValueError("nope")
+
+    for _ in range(2):
+        try:
+            flight.do("k", boom)
+        except ValueError as e:
+            assert str(e) == "nope"
+        else:
+            raise AssertionError("expected ValueError")
+    assert flight.snapshot()["in_flight"] == 0
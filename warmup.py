@@ -0,0 +1,157 @@
+# warmup.py
+"""
+Startup warm-up and readiness reporting.
+
+Right after a restart the first user would pay for loading the embedding model,
+opening LanceDB, compiling graphs and reading cold SQLite pages. start_warmup()
+does all of that in a background thread when the server starts; readiness()
+reports whether the instance is hot and how long each component took, so a load
+balancer can hold traffic back until then (chat_ui serves it at GET /ready).
+Failed steps are retried in the background with backoff until they all succeed.
+
+Run `python warmup.py` to warm up once and print the report.
+"""
+import os
+import json
+import sqlite3
+import threading
+import time
+
+WARMUP_ENABLED = os.getenv("FOODCHAT_WARMUP", "1") == "1"
+# Seconds before failed steps are retried; doubles after each failed attempt up to the max.
+WARMUP_RETRY_SECONDS = 10
+WARMUP_RETRY_MAX_SECONDS = 300
+
+
+class WarmupStatus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = False
+        self.finished = False
+        self.attempts = 0
+        self.components = {}
+
+    def record(self, name, seconds, error=None):
+        with self.lock:
+            self.components[name] = {
+                "ok": error is None,
+                "seconds": round(seconds, 3),
+                **({"error": str(error)} if error is not None else {}),
+            }
+
+    def snapshot(self):
+        with self.lock:
+            ok = all(c["ok"] for c in self.components.values())
+            return {
+                "ready": self.finished and ok,
+                "finished": self.finished,
+                "attempts": self.attempts,
+                "components": dict(self.components),
+            }
+
+
+status = WarmupStatus()
+
+
+def _ok(name):
+    with status.lock:
+        return status.components.get(name, {}).get("ok", False)
+
+
+def _step(name, fn, requires=None):
+    if _ok(name):
+        return
+    if requires and not _ok(requires):
+        # Don't load the model again in every dependent step; retried with it next attempt.
+        status.record(name, 0.0, f"skipped: '{requires}' failed")
+        return
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        status.record(name, time.perf_counter() - start, e)
+        print(f"Warm-up step '{name}' failed: {e}")
+    else:
+        status.record(name, time.perf_counter() - start)
+
+
+def _prime_menu():
+    import db_manager
+    from modules.food_lexicon import menu_terms
+
+    # Read the whole foods table once so its pages are in the OS cache.
+    connection = sqlite3.connect(db_manager.DB_PATH)
+    connection.execute("SELECT id, food_name, food_category, restaurant_name, price FROM foods").fetchall()
+    connection.close()
+    menu_terms()
+
+
+def _compile_graphs():
+    from modules import food_services, food_suggestion
+
+    # Graphs are compiled at import (food_info's when its module is built); drawing them
+    # makes sure every node and edge resolved.
+    for graph in (food_services.GRAPH, food_suggestion.graph):
+        graph.get_graph()
+
+
+def _sync_menu_index():
+    from modules import food_suggestion
+    from modules.menu_index import sync_menu_index
+
+    # Only needed when suggestions use semantic search.
+    if food_suggestion.SEARCH_MODE == "semantic":
+        sync_menu_index(force=True)
+
+
+def run_warmup():
+    """
+    Warm up every component in order, recording per-component durations.
+    Steps that already succeeded are skipped, so calling it again retries only the failed ones.
+    """
+    import main
+
+    with status.lock:
+        status.started = True
+        status.attempts += 1
+
+    _step("food_info_module", main.get_food_info_module)
+    _step("embedding", lambda: main.get_food_info_module().embedding.embed_query("warm up"),
+          requires="food_info_module")
+    _step("vector_query", lambda: main.get_food_info_module().retriever.invoke("nutritional value of apples"),
+          requires="food_info_module")
+    _step("menu_data", _prime_menu)
+    _step("graphs", _compile_graphs)
+    _step("session_store", lambda: main.get_session_store().checkpointer())
+    _step("menu_index", _sync_menu_index)
+
+    with status.lock:
+        status.finished = True
+    return status.snapshot()
+
+
+def _warm_up_until_ready():
+    delay = WARMUP_RETRY_SECONDS
+    while not run_warmup()["ready"]:
+        print(f"Warm-up incomplete; retrying failed steps in {delay} seconds.")
+        time.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+
+
+def start_warmup():
+    """Start the warm-up in a background thread (once per process), retrying failed steps until ready."""
+    with status.lock:
+        if status.started or not WARMUP_ENABLED:
+            return
+        status.started = True
+    threading.Thread(target=_warm_up_until_ready, name="warmup", daemon=True).start()
+
+
+def readiness():
+    if not WARMUP_ENABLED:
+        return {"ready": True, "finished": False, "attempts": 0, "components": {}}
+    return status.snapshot()
+
+
+if __name__ == "__main__":
+    print(json.dumps(run_warmup(), indent=2))